@@ -39,10 +39,13 @@ some of the literature cited there as well.
 '''
 
 
+import numpy as np
+
 from multivariate import d2
+from utils import length_scales, parallel_map, scale_histogram
 
 
-def av_d2():
+def av_d2(eps, values, a=1, m=1, M=None, E=False):
 
     '''
     Correlation integral
@@ -97,12 +100,33 @@ def av_d2():
     c2g provides Gaussian kernel correlation integrals. Both act on
     the correlation sum data (extension .c2).
 
+
+    Python usage
+
+    eps and values are the length scales and one of the arrays
+    returned by d2, c1 or c2_naive, with one row per embedding
+    dimension (the first row being dimension 1) and one column per
+    length scale; further leading axes, e.g. a stack of many d2
+    results with the same eps, are averaged alike. Returns eps and
+    the averages of the rows m, ..., M at the length scales with a
+    complete interval of 2a+1 points. nan values spoil the averages
+    they enter. eps may also have one row per dimension, like the
+    radius returned by c1.
+
     '''
 
-    raise NotImplementedError
+    eps, values = _scales(eps, values)
+    values = values[..., m - 1:M, :]
+    if eps.ndim > 1:
+        eps = eps[..., m - 1:M, :]
+    if E:
+        eps = eps / eps.max()
+    averages = _sliding_sums(values, a) / (2 * a + 1.0)
+    return eps[..., a:eps.shape[-1] - a], averages
 
 
-def c2_naive():
+def c2_naive(data, m=1, M=10, d=1, t=0, n=2, l=None, x=0, workers=None,
+             tile=256):
 
     '''
     Correlation integral
@@ -132,12 +156,71 @@ def c2_naive():
     Note: For longer signals, the program is much slower than the
     version d2 that uses fast neighbour search.
 
-    '''
 
-    raise NotImplementedError
+    Python usage
 
+    data is a 1-D array, n the resolution (-#). Returns eps, the
+    length scales (max data interval) * 2**(-k/n) in decreasing order
+    down to the smallest distance found, and c2, the correlation sums
+    with one row per embedding dimension m, ..., M. Pairs of delay
+    vectors i < j with j - i > t are counted, the same pairs for all
+    dimensions.
 
-def c2d():
+    The pairs are evaluated in tiles of tile x tile vectors; the
+    maximum norm distances of each tile are derived dimension by
+    dimension from the ones of the previous dimension. With workers,
+    the rows of tiles are shared by a pool of threads.
+
+    '''
+
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if series.ndim != 1:
+        raise ValueError('c2_naive works on scalar data only')
+    size = len(series) - (M - 1) * d
+    if size <= t + 1 or m < 1 or M < m:
+        raise ValueError('time series too short or bad dimensions')
+    interval = float(series.max() - series.min()) or 1.0
+    # distances in units of the data interval
+    scaled = (series - series.min()) / interval
+    scales = length_scales(n)
+
+    def row(lo):
+        histogram = np.zeros((M - m + 1, len(scales) + 1), dtype=np.int64)
+        first = scaled[lo:min(lo + tile, size)]
+        rows = np.arange(lo, lo + len(first))
+        for start in range(lo, size, tile):
+            cols = np.arange(start, min(start + tile, size))
+            valid = None
+            if cols[0] - rows[-1] <= t:
+                valid = cols[None, :] - rows[:, None] > t
+                if not valid.any():
+                    continue
+            dist = np.abs(np.subtract.outer(first, scaled[cols]))
+            for dimension in range(1, M + 1):
+                if dimension > 1:
+                    shift = (dimension - 1) * d
+                    step = np.subtract.outer(scaled[rows + shift],
+                                             scaled[cols + shift])
+                    np.maximum(dist, np.abs(step, out=step), out=dist)
+                if dimension < m:
+                    continue
+                histogram[dimension - m] += scale_histogram(
+                    dist if valid is None else dist[valid], n)
+        return histogram
+
+    histogram = sum(parallel_map(row, range(0, size, tile), workers))
+    # pairs closer than eps[k] are those with more than k scales above
+    found = histogram[:, ::-1].cumsum(axis=1)[:, ::-1][:, 1:]
+    pairs = (size - t) * (size - t - 1) // 2
+    used = np.nonzero(found[-1] > 0)[0]
+    last = used[-1] + 1 if len(used) else 1
+    eps = interval * scales[:last]
+    return eps, found[:, :last] / float(pairs)
+
+
+def c2d(eps, c2, a=1):
 
     '''
     Correlation integral
@@ -161,12 +244,31 @@ def c2d():
     Alternatives to local slopes are Takens' estimator c2t or to use
     Gaussian kernel smoothing c2g before computing slopes.
 
+
+    Python usage
+
+    eps and c2 as returned by d2, c1 or c2_naive (any number of rows
+    or leading axes). Returns eps and the slopes of the least squares
+    lines through the points (log eps, log c2) of the intervals of 2a+1
+    length scales, where they are complete; intervals with a vanishing
+    correlation sum give nan.
+
     '''
 
-    raise NotImplementedError
+    eps, c2 = _scales(eps, c2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = np.log(np.where(c2 > 0, c2, np.nan))
+        x = np.log(eps)
+        width = 2 * a + 1.0
+        sx = _sliding_sums(x, a)
+        sxx = _sliding_sums(x * x, a)
+        sy = _sliding_sums(y, a)
+        sxy = _sliding_sums(x * y, a)
+        slope = (width * sxy - sx * sy) / (width * sxx - sx * sx)
+    return eps[..., a:eps.shape[-1] - a], slope
 
 
-def c2t():
+def c2t(eps, c2):
 
     '''
     Takens estimator
@@ -189,9 +291,88 @@ def c2t():
     power law between the available points. Output is to stdout, or to
     file file_t if -o is given.
 
+
+    Python usage
+
+    eps and c2 as returned by d2, c1 or c2_naive (any number of rows
+    or leading axes). Returns the Takens estimator at every length
+    scale, in the order of eps. The integral starts at the smallest
+    length scale with a nonzero correlation sum, below which the power
+    law of the first interval is continued to 0; from the first
+    vanishing correlation sum downwards, the estimator is nan.
+
+    '''
+
+    eps, c2 = _scales(eps, c2)
+    eps, c2 = np.broadcast_arrays(eps, c2)
+    if eps.shape[-1] < 2:
+        return np.full(c2.shape, np.nan)
+    order = np.argsort(eps, axis=-1)
+    r = np.take_along_axis(eps, order, axis=-1)
+    c = np.take_along_axis(c2, order, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c = np.where(c > 0, c, np.nan)
+        # exponents of the power laws between neighbouring scales
+        ratio = c[..., 1:] / c[..., :-1]
+        b = np.log(ratio) / np.log(r[..., 1:] / r[..., :-1])
+        # integral of C(x)/x over each interval, C = c_i (x/r_i)**b
+        pieces = np.where(b != 0, (c[..., 1:] - c[..., :-1]) / b,
+                          c[..., :-1] * np.log(r[..., 1:] / r[..., :-1]))
+        # the integral starts above the last vanishing correlation sum
+        vanishing = np.isnan(c)
+        size = c.shape[-1]
+        start = np.where(vanishing.any(axis=-1),
+                         size - np.argmax(vanishing[..., ::-1], axis=-1), 0)
+        valid = np.arange(size) >= start[..., None]
+        pieces = np.where(valid[..., :-1], pieces, 0.0)
+        # the power law of the first interval, continued to 0
+        first = np.minimum(start, size - 2)[..., None]
+        below = (np.take_along_axis(c, first, axis=-1)
+                 / np.take_along_axis(b, first, axis=-1))
+        below = np.where(start[..., None] < size - 1, below, np.nan)
+        integral = below + np.concatenate(
+            [np.zeros_like(below), np.cumsum(pieces, axis=-1)], axis=-1)
+        estimate = np.where(valid, c / integral, np.nan)
+    result = np.empty_like(estimate)
+    np.put_along_axis(result, order, estimate, axis=-1)
+    return result
+
+
+def _scales(eps, values):
+
+    '''
+    Length scales and values as float arrays with the scales on the
+    last axis.
+
+    '''
+
+    eps = np.asarray(eps, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if values.shape[-1] != eps.shape[-1]:
+        raise ValueError('%d length scales, %d values'
+                         % (eps.shape[-1], values.shape[-1]))
+    return eps, values
+
+
+def _sliding_sums(values, a):
+
+    '''
+    Sums over the windows of 2a+1 consecutive values along the last
+    axis, from cumulative sums; windows with a nan give nan.
+
     '''
 
-    raise NotImplementedError
+    width = 2 * a + 1
+    inside = max(values.shape[-1] - width + 1, 0)
+    broken = np.isnan(values)
+    total = np.cumsum(np.where(broken, 0.0, values), axis=-1)
+    total = np.concatenate([np.zeros(values.shape[:-1] + (1,)), total],
+                           axis=-1)
+    gaps = np.concatenate([np.zeros(values.shape[:-1] + (1,), dtype=int),
+                           np.cumsum(broken, axis=-1)], axis=-1)
+    sums = total[..., width:width + inside] - total[..., :inside]
+    holes = gaps[..., width:width + inside] - gaps[..., :inside]
+    return np.where(holes > 0, np.nan, sums)
 
 from multivariate import c1
 
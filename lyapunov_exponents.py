@@ -23,7 +23,17 @@ additional information.
 '''
 
 
-def lyap_k():
+import functools
+
+import numpy as np
+
+from neighbour_search import BoxIndex, take
+from phase_space import delay
+from utils import worker_pool
+
+
+def lyap_k(data, m=2, M=2, d=1, r=None, R=None, scales=5, n=None, s=50, t=0,
+           l=None, x=0, block=1024, index=None):
 
     '''
     Maximal exponent
@@ -79,13 +89,95 @@ def lyap_k():
     3. The number of points for which a neighborhood with enough
        points was found
 
+
+    Python usage
+
+    data is a 1-D array, scales the number of length scales (-#) and
+    n the number of reference points, taken from the beginning. Returns
+    eps (increasing from r to R), the logarithms of the stretching
+    factors with one row per dimension m, ..., M, one column per
+    length scale and s+1 iterations on the last axis, and the number
+    of reference points with at least one neighbour (one row per
+    dimension, one column per length scale).
+
+    Each reference point is searched for only once per dimension,
+    with radius R; the neighbours sorted by distance within the
+    smaller radii are prefixes of that list. The distances of all
+    neighbours s steps ahead are gathered at once (in blocks of block
+    reference points), and the sums over every prefix taken from their
+    cumulative sums. For a single dimension (m == M), an index of
+    delay(data, m, d) built before can be passed as index.
+
     '''
 
-    raise NotImplementedError
+    series = np.asarray(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    interval = float(series.max() - series.min()) or 1.0
+    if r is None:
+        r = interval / 1000.0
+    if R is None:
+        R = interval / 100.0
+    eps = r * (float(R) / r) ** (np.arange(scales) / max(scales - 1.0, 1.0))
+    if index is not None and m != M:
+        raise ValueError('an index can only be passed for a single dimension')
+
+    stretch = np.full((M - m + 1, scales, s + 1), np.nan)
+    found = np.zeros((M - m + 1, scales), dtype=np.int64)
+    for dimension in range(m, M + 1):
+        last = (dimension - 1) * d
+        usable = len(series) - last - s
+        if usable <= 0:
+            raise ValueError('time series too short')
+        if index is None or dimension > m:
+            index = BoxIndex(delay(series, dimension, d))
+        references = np.arange(usable if n is None else min(n, usable))
+        # the future of the newest coordinate of every vector
+        future = delay(series[last:], s + 1, 1)
+        sums = np.zeros((scales, s + 1))
+        for lo in range(0, len(references), block):
+            refs = references[lo:lo + block]
+            # neighbours within R whose future is known, by distance
+            q, j, dist = index.radius(R, times=refs, window=t,
+                                      limit=usable, sort=True)
+            logs, ok = _stretching(q, j, dist, refs, eps, future)
+            sums += np.where(ok[..., None], logs, 0.0).sum(axis=0)
+            found[dimension - m] += ok.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stretch[dimension - m] = sums / found[dimension - m][:, None]
+    return eps, stretch, found
+
+
+def _stretching(q, j, dist, refs, eps, future):
+
+    '''
+    Logarithm of the mean distance of the neighbours within each eps
+    for every reference point and step, and whether it was defined.
 
+    '''
+
+    counts = np.bincount(q, minlength=len(refs))
+    starts = np.cumsum(counts) - counts
+    # neighbours closer than eps, a prefix of each sorted list
+    inside = np.stack([np.bincount(q[dist < e], minlength=len(refs))
+                       for e in eps], axis=1)
+    distance = np.abs(future[refs[q]] - future[j])
+    distance = np.concatenate([distance, np.zeros((1, future.shape[1]))])
+    # sums over the rings between consecutive scales, then over prefixes
+    bounds = starts[:, None] + np.column_stack([np.zeros(len(refs), int),
+                                                inside[:, :-1]])
+    rings = np.add.reduceat(distance, bounds.ravel(), axis=0)
+    width = np.diff(np.append(bounds.ravel(), len(q)))
+    rings[width == 0] = 0.0
+    sums = rings.reshape(inside.shape + (-1,)).cumsum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        logs = np.log(sums / inside[..., None])
+    return logs, (inside > 0) & np.isfinite(logs).all(axis=2)
+
+
+def lyap_r(data, m=2, d=1, t=0, r=None, s=50, l=None, x=0, workers=None,
+           block=4096, curves=None, index=None):
 
-def lyap_r():
-    
     '''
     Maximal exponent
 
@@ -118,16 +210,127 @@ def lyap_r():
     First column: Number of the iteration
     Second column: Logarithm of the stretching factor
 
+
+    Python usage
+
+    data is a 1-D array. Returns the logarithms of the stretching
+    factors for the iterations 0, ..., s, averaged over all reference
+    points whose neighbour is at a nonzero distance.
+
+    The nearest neighbours of a block of block reference points are
+    found with one query (the radius starts at r and is doubled until
+    every point has a neighbour), and the distances of all pairs over
+    the s iterations gathered into one (block, s+1) array. With workers,
+    the blocks are done by a pool of processes. With curves, a file
+    name, the logarithms of the distances of every reference point are
+    also written to that file (a .npy file, nan where the distance
+    vanishes) and returned as a memory-mapped array, e.g. to bootstrap
+    confidence bands: stretch, curves = lyap_r(..., curves='file.npy').
+    An index of delay(data, m, d) built before can be passed as index.
+
+    '''
+
+    series = np.asarray(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if r is None:
+        r = (float(series.max() - series.min()) or 1.0) / 1000.0
+    usable = len(series) - (m - 1) * d - s
+    if usable <= t + 1:
+        raise ValueError('time series too short')
+
+    stored = None
+    if curves is not None:
+        stored = np.lib.format.open_memmap(curves, mode='w+', dtype=float,
+                                           shape=(usable, s + 1))
+    total = np.zeros(s + 1)
+    count = np.zeros(s + 1, dtype=np.int64)
+    blocks = [np.arange(lo, min(lo + block, usable))
+              for lo in range(0, usable, block)]
+    setup = (series, m, d, t, r, s, usable, index)
+    if workers and workers > 1:
+        pool = worker_pool(workers, True, _lyap_r_setup, (setup,))
+        task = _lyap_r_block
+    else:
+        # no module state is left behind by a serial run
+        pool = worker_pool()
+        task = functools.partial(_lyap_r_block, state=_lyap_r_prepare(setup))
+    with pool:
+        for refs, logs in zip(blocks, pool.map(task, blocks)):
+            if stored is not None:
+                stored[refs] = logs
+            total += np.nansum(logs, axis=0)
+            count += np.isfinite(logs).sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        stretch = total / count
+    if stored is not None:
+        stored.flush()
+        return stretch, stored
+    return stretch
+
+
+# the state of lyap_r in a worker process, see _lyap_r_setup
+_lyap_r_state = {}
+
+
+def _lyap_r_setup(setup):
+
+    '''
+    Keep the data and the box index of lyap_r in the worker process.
+
+    '''
+
+    _lyap_r_state.update(_lyap_r_prepare(setup))
+
+
+def _lyap_r_prepare(setup):
+
+    '''
+    The delay vectors and the box index needed by _lyap_r_block.
+
+    '''
+
+    series, m, d, t, r, s, usable, index = setup
+    vectors = delay(series, m, d)
+    if index is None:
+        index = BoxIndex(vectors)
+    return dict(vectors=vectors, index=index, t=t, r=r, s=s, usable=usable)
+
+
+def _lyap_r_block(refs, state=None):
+
+    '''
+    Logarithms of the distances of a block of reference points to their
+    nearest neighbours over the iterations, one row per point. The
+    state is that of the worker process unless given.
+
     '''
 
-    raise NotImplementedError
+    if state is None:
+        state = _lyap_r_state
+    vectors = state['vectors']
+    near, _ = state['index'].knn(1, eps=state['r'], times=refs,
+                                 window=state['t'], limit=state['usable'])
+    near = near[:, 0]
+    logs = np.full((len(refs), state['s'] + 1), np.nan)
+    found = near >= 0
+    steps = np.arange(state['s'] + 1)
+    ahead = vectors[refs[found, None] + steps] - vectors[near[found, None]
+                                                         + steps]
+    with np.errstate(divide='ignore'):
+        distance = np.log(np.sqrt((ahead ** 2).sum(axis=2)))
+    distance[np.isinf(distance)] = np.nan
+    logs[found] = distance
+    return logs
+
 
 
 # def lyap_spec():
 from multivariate import lyap_spec
 
 
-def fsle():
+def fsle(data, m=2, d=1, t=0, r=None, l=None, x=0, factor=np.sqrt(2.0),
+         chunk=64, index=None):
 
     '''
     Finite size exponents
@@ -164,7 +367,94 @@ def fsle():
     First column: length scale in natural (data) units
     Second column: Estimate finite size Lyapunov exponent
     Third column: Number of points used for this length scale
-    
+
+
+    Python usage
+
+    data is a 1-D array. The length scales are r * factor**k up to the
+    data interval. Every reference point whose nearest neighbour
+    (outside the window t) is closer than r forms a pair. The time
+    T(k) the distance of the pair (maximum norm) takes to grow from
+    the k-th to the k+1-th scale is averaged over the pairs, and the
+    exponent is log(factor) / <T(k)>. Returns the length scales, the
+    exponents, the number of pairs per scale and the times at which
+    every pair first reached every scale (one row per pair, -1 where
+    it never did), e.g. to bootstrap the averages.
+
+    The distances of all pairs are followed chunk steps at a time. The
+    running maximum of each distance is turned into the index of the
+    largest scale reached, which grows monotonically along each row,
+    so that the first passages of all scales are found with a single
+    searchsorted. Pairs leave as soon as they reached the largest
+    scale or the end of the data. An index of delay(data, m, d) built
+    before can be passed as index.
+
+    '''
+
+    series = np.asarray(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if r is None:
+        r = (series.std() or 1.0) / 1000.0
+    interval = float(series.max() - series.min()) or 1.0
+    scales = int(np.floor(np.log(interval / r) / np.log(factor) + 1e-9)) + 1
+    if scales < 2:
+        raise ValueError('r is too large')
+    eps = r * factor ** np.arange(scales)
+
+    vectors = delay(series, m, d)
+    if index is None:
+        index = BoxIndex(vectors)
+    q, j, _ = index.radius(r, window=t, sort=True)
+    first = np.unique(q, return_index=True)[1]
+    refs, near = q[first], j[first]
+
+    passage = _first_passage(vectors, refs, near, eps, chunk)
+    spans = np.diff(passage, axis=1).astype(float)
+    both = (passage[:, :-1] >= 0) & (passage[:, 1:] >= 0)
+    count = both.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        time = np.where(both, spans, 0.0).sum(axis=0)
+        exponent = np.log(factor) * count / time
+    return eps[:-1], exponent, count, passage
+
+
+def _first_passage(vectors, refs, near, eps, chunk):
+
+    '''
+    First time at which the distance of each pair reaches each of the
+    increasing length scales eps, -1 if it never does.
+
     '''
 
-    raise NotImplementedError
+    scales = len(eps)
+    passage = np.full((len(refs), scales), -1, dtype=np.int64)
+    # pairs still moving apart, their running maximum and time
+    active = np.arange(len(refs))
+    top = np.zeros(len(refs))
+    start = 0
+    ends = len(vectors) - np.maximum(refs, near)
+    while len(active):
+        steps = np.arange(start, start + chunk)
+        inside = steps[None, :] < ends[active, None]
+        rows = np.minimum(steps[None, :], ends[active, None] - 1)
+        distance = np.abs(take(vectors, refs[active, None] + rows)
+                          - take(vectors, near[active, None] + rows)
+                          ).max(axis=2)
+        distance = np.where(inside, distance, 0.0)
+        distance[:, 0] = np.maximum(distance[:, 0], top[active])
+        distance = np.maximum.accumulate(distance, axis=1)
+        # number of scales reached, monotone along each row
+        level = np.searchsorted(eps, distance, side='right')
+        keys = (np.arange(len(active))[:, None] * (scales + 1)
+                + level).ravel()
+        targets = np.arange(len(active))[:, None] * (scales + 1) \
+            + np.arange(1, scales + 1)
+        hit = np.searchsorted(keys, targets.ravel()).reshape(targets.shape)
+        hit -= np.arange(len(active))[:, None] * chunk
+        reached = (hit < chunk) & (passage[active] < 0)
+        passage[active] = np.where(reached, start + hit, passage[active])
+        top[active] = distance[:, -1]
+        start += chunk
+        active = active[(level[:, -1] < scales) & (ends[active] > start)]
+    return passage
@@ -34,6 +34,19 @@ specific program descriptions.
 
 '''
 
+
+import functools
+import os
+import time
+import zlib
+
+import numpy as np
+
+from neighbour_search import BoxIndex, take
+from phase_space import delay
+from utils import (length_scales, parallel_map, scale_histogram,
+                   worker_pool)
+
 def ar_model():
 
     '''
@@ -159,14 +172,15 @@ def sav_gol():
 
     '''
 
-   raise NotImplementedError
+    raise NotImplementedError
 
 
 # def recurr():
 from stationarity import recurr
 
 
-def xzero():
+def xzero(data, m=3, d=1, n=None, k=30, r=None, f=1.2, s=1, l=None, x=0,
+          channels=None, workers=None):
     '''
     Nonlinear cross-prediction
 
@@ -208,12 +222,73 @@ def xzero():
               (x2n+steps= av(x1i+steps)
     -------------------------------------------------------------------
 
-    '''
 
-    raise NotImplementedError
+    Python usage
+
+    data is a 2-D array with one column per data set. Returns the
+    forecast error of set 2 (column 1) from set 1 (column 0), relative
+    to the standard deviation of set 2.
+
+    With channels, a list of columns, all pairs of these are cross
+    predicted and the (channels x channels) matrix of errors is
+    returned; the row is the channel whose neighbours are used (set 1),
+    the column the channel predicted (set 2). On the diagonal, each
+    channel is predicted from itself, excluding the point itself. The
+    delay vectors and box index of every channel are built once and
+    queried by all other channels; the rows of the matrix are shared
+    by a pool of workers threads. r defaults to the data interval of
+    set 1 / 1000.
 
+    '''
 
-def xc2():
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    pairwise = channels is not None
+    if not pairwise:
+        channels = [0, 1]
+    channels = list(channels)
+    span = (m - 1) * d
+    usable = len(series) - span - s
+    if usable <= k:
+        raise ValueError('time series too short')
+    count = usable if n is None else min(n, usable)
+
+    def embed(column):
+        values = series[:, column]
+        vectors = delay(values, m, d)
+        radius = r
+        if radius is None:
+            radius = float(values.max() - values.min()) / 1000.0 or 1.0
+        return vectors, BoxIndex(vectors), radius, values[span + s:]
+
+    embeddings = parallel_map(embed, channels, workers)
+
+    def error(source, target):
+        _, index, radius, images = embeddings[source]
+        others, _, _, future = embeddings[target]
+        points = take(others, np.arange(count))
+        times, window = None, -1
+        if target == source:
+            times, window = np.arange(count), 0
+        q, j, _, _ = index.grow(k, eps=radius, factor=f, points=points,
+                                times=times, window=window, limit=usable)
+        found = np.bincount(q, minlength=count)
+        with np.errstate(invalid='ignore'):
+            forecast = np.bincount(q, images[j], minlength=count) / found
+        return np.sqrt(np.nanmean(
+            (forecast - future[:count]) ** 2)) / future.std()
+
+    def row(source):
+        return [error(source, target) for target in range(len(channels))]
+
+    if not pairwise:
+        return error(0, 1)
+    return np.array(parallel_map(row, range(len(channels)), workers))
+
+
+def xc2(data, M, n, t, d=1, N=1000, resolution=2, r=None, R=None, l=None,
+        x=0, columns=(0, 1), seed=0, block=None):
 
     '''
     Cross-correlation integral
@@ -267,12 +342,107 @@ def xc2():
     points with distance smaller than the value reportet in the first
     column.
 
-    '''
 
-    raise NotImplementedError
+    Python usage
+
+    data is a 2-D array, columns the two columns used as the sets X and
+    Y, resolution the number of length scales per octave (-#). Returns
+    eps (decreasing from R by factors 2**(1/resolution), down to r or,
+    by default, to the smallest distance of a pair of the two sets in 2
+    dimensions) and the arrays c_xy, c_xx and c_yy, the cross
+    correlation integral and the correlation integrals of X and of Y,
+    with one row per embedding dimension 2, ..., M and one column per
+    eps.
+
+    All three integrals are counted in the same pass over the centres.
+    The centres i are taken in a random order (seed) and in blocks of
+    block of them; for each, the distances of x_i to all y_j and of y_i
+    to all x_j (cross integral), of x_i to all x_j and of y_i to all y_j
+    are computed, with |i - j| > t. Only the pairs closer than the
+    largest open length scale are kept; their distances in dimension
+    m+1 are derived from those in dimension m (maximum norm) and binned
+    from their binary exponent and mantissa into one histogram of all
+    length scales per dimension. Once n centres are done, a length scale
+    of an integral is closed as soon as it has N pairs in M dimensions;
+    the estimate stops when all scales are closed or all centres used.
+    N=0 uses all centres.
 
+    '''
 
-def d2():
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if series.ndim != 2:
+        raise ValueError('xc2 needs two columns of data')
+    if M < 2:
+        raise ValueError('maximal embedding dimension has to be at least 2')
+    sets = series[:, list(columns)].T
+    if R is None:
+        R = float(np.max(sets.max(axis=1) - sets.min(axis=1))) or 1.0
+    sets = sets / R
+    size = len(series) - (M - 1) * d
+    if size <= t + 1:
+        raise ValueError('time series too short')
+
+    eps = R * length_scales(resolution)
+    scales = len(eps)
+    wanted = np.ones(scales, dtype=bool) if r is None else eps >= r
+    # cross integral (both directions), auto integrals of X and Y
+    tables = [[(0, 1), (1, 0)], [(0, 0)], [(1, 1)]]
+    found = np.zeros((3, M - 1, scales), dtype=np.int64)
+    pairs = np.zeros((3, scales), dtype=np.int64)
+    scale_open = np.tile(wanted, (3, 1))
+
+    if block is None:
+        block = max(1, (1 << 20) // size)
+    order = np.random.RandomState(seed).permutation(size)
+    others = np.arange(size)
+    done = 0
+    for centres in _blocks(order, block):
+        if not scale_open.any():
+            break
+        near = np.abs(centres[:, None] - others) <= t
+        valid = near.size - np.count_nonzero(near)
+        for table, directions in enumerate(tables):
+            scale = scale_open[table]
+            if not scale.any():
+                continue
+            # pairs beyond the largest open scale are never counted
+            reach = eps[scale].max() / R
+            for a, b in directions:
+                dist = np.maximum(
+                    np.abs(sets[a, centres, None] - sets[b, others]),
+                    np.abs(sets[a, centres + d, None] - sets[b, others + d]))
+                close = (dist < reach) & ~near
+                i, j = np.nonzero(close)
+                i, dist = centres[i], dist[close]
+                for lag in range(1, M):
+                    if lag > 1:
+                        shift = lag * d
+                        dist = np.maximum(dist, np.abs(sets[a, i + shift]
+                                                       - sets[b, j + shift]))
+                        close = dist < reach
+                        i, j, dist = i[close], j[close], dist[close]
+                    histogram = scale_histogram(dist, resolution)
+                    # pairs closer than eps[k] are in the bins k+1, ...
+                    closer = histogram[::-1].cumsum()[::-1][1:]
+                    found[table, lag - 1, scale] += closer[scale]
+                pairs[table, scale] += valid
+        done += len(centres)
+        if N and done >= n:
+            scale_open &= found[:, -1] < N
+
+    if r is None:
+        last = np.nonzero(found[0, 0])[0]
+        wanted[last[-1] + 1 if len(last) else 1:] = False
+    with np.errstate(invalid='ignore'):
+        c2 = found[:, :, wanted] / pairs[:, None, wanted].astype(float)
+    return eps[wanted], c2[0], c2[1], c2[2]
+
+
+def d2(data, M=(1, 10), d=1, t=0, r=None, R=None, n=100, N=1000, E=False,
+       l=None, x=0, workers=None, block=1000, seed=0, checkpoint=None,
+       interval=120.0):
     '''
     Correlation integral, also for multivariate data
 
@@ -380,13 +550,306 @@ def d2():
 
     http://www.mpipks-dresden.mpg.de/~tisean/TISEAN_2.1/index.html
 
+
+    Python usage
+
+    data is a 1-D array or a 2-D array with one column per component,
+    M the pair (components, lags), n the number of epsilon values (-#).
+    Returns eps (decreasing from R to r) and the arrays c2, d2 and h2,
+    with one row per embedding dimension 1, ..., components*lags and
+    one column per eps. The last row of h2 is nan, since it needs the
+    next dimension.
+
+    Every pair of points is found once by a box assisted search and
+    its distance binned into a logarithmic histogram of all length
+    scales; the distances in higher dimensions are derived from those
+    in lower ones (maximum norm). The reference points are taken in a
+    random order (seed) and in blocks of block points. With workers,
+    the blocks are counted by a pool of processes and the histograms
+    merged in the order of the blocks, so that the -N limit is applied
+    exactly as without workers: once the largest dimension has N pairs
+    at a length scale, the scale is closed, and the search radius
+    shrinks to the largest open scale.
+
+    With checkpoint, a file name, the state of the estimate is written
+    to that file every interval seconds, and a run killed before the
+    end resumes from there (see d2_snapshots). Use d2_snapshots to see
+    preliminary results while the program is still running.
+
     '''
 
-    raise NotImplementedError
+    for result in d2_snapshots(data, M, d, t, r, R, n, N, E, l, x, workers,
+                               block, seed, checkpoint, interval):
+        pass
+    return result
 
 
-def c1():
-    
+def d2_snapshots(data, M=(1, 10), d=1, t=0, r=None, R=None, n=100, N=1000,
+                 E=False, l=None, x=0, workers=None, block=1000, seed=0,
+                 checkpoint=None, interval=120.0):
+
+    '''
+    Correlation sums of d2 while they are computed
+
+    Generates (eps, c2, d2, h2) as returned by d2, from the reference
+    points done so far, about every interval seconds (real time, not
+    cpu time), and the final result last. The options are those of d2.
+
+    With checkpoint, the name of a file, the state of the estimate is
+    saved to that file with every snapshot and at the end. If the file
+    exists when starting, the estimate continues after the last block
+    of reference points saved there. The file remembers the data and
+    the options; resuming with different ones is an error.
+
+    '''
+
+    key = _fingerprint(data, M, d, t, r, R, n, N, E, l, x, block, seed)
+    start = _load_checkpoint(checkpoint, key)
+    if start is not None:
+        start['done'] = int(start['done'])
+        start['dimensions'] = int(start['dimensions'])
+    last = time.time()
+    for state in _d2_run(data, M, d, t, r, R, n, N, E, l, x, workers,
+                         block, seed, start):
+        if interval is not None and time.time() - last >= interval:
+            _save_checkpoint(checkpoint, key, state)
+            yield _d2_result(state)
+            last = time.time()
+    _save_checkpoint(checkpoint, key, state)
+    yield _d2_result(state)
+
+
+def _fingerprint(data, *options):
+
+    '''
+    Key identifying the data and the options of a checkpointed run.
+
+    '''
+
+    data = np.ascontiguousarray(data)
+    return '%08x %s %r' % (zlib.crc32(data.view(np.uint8)), data.shape,
+                           options)
+
+
+def _load_checkpoint(path, key):
+
+    '''
+    The state saved to path by _save_checkpoint, None if there is none.
+
+    '''
+
+    if path is None or not os.path.exists(path):
+        return None
+    with np.load(path) as saved:
+        if str(saved['key']) != key:
+            raise ValueError('checkpoint %s belongs to another run' % path)
+        return dict((name, saved[name]) for name in saved.files
+                    if name != 'key')
+
+
+def _save_checkpoint(path, key, state):
+
+    '''
+    Save a state of numpy arrays and numbers, atomically replacing the
+    previous one.
+
+    '''
+
+    if path is None:
+        return
+    partial = path + '.part'
+    with open(partial, 'wb') as handle:
+        np.savez(handle, key=key, **state)
+    os.replace(partial, path)
+
+
+def _d2_run(data, M, d, t, r, R, n, N, E, l, x, workers, block, seed,
+            start=None):
+
+    '''
+    Count the pairs block by block; generates the state of the
+    estimate at the start and after every round of blocks.
+
+    '''
+
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if series.ndim == 1:
+        series = series[:, None]
+    components, lags = M
+    series = series[:, :components]
+    if series.shape[1] < components:
+        raise ValueError('data has only %d components' % series.shape[1])
+    if E:
+        lower = series.min(axis=0)
+        span = series.max(axis=0) - lower
+        series = (series - lower) / np.where(span > 0, span, 1.0)
+    if R is None:
+        R = float(np.max(series.max(axis=0) - series.min(axis=0)))
+    if r is None:
+        r = R / 1000.0
+    eps = R * (float(r) / R) ** (np.arange(n) / max(n - 1.0, 1.0))
+
+    size = len(series) - (lags - 1) * d
+    if size <= t + 1:
+        raise ValueError('time series too short')
+    blocks = _blocks(np.random.RandomState(seed).permutation(size), block)
+
+    state = start
+    if state is None:
+        state = dict(eps=eps, dimensions=components * lags, done=0,
+                     found=np.zeros((components * lags, n), dtype=np.int64),
+                     pairs=np.zeros(n, dtype=np.int64),
+                     open=np.ones(n, dtype=bool))
+    setup = (series, components, lags, d, t, size, R, r, n)
+    yield state
+    rounds = max(1, workers or 1)
+    if rounds > 1:
+        pool = worker_pool(workers, True, _d2_setup, (setup,))
+        task = _d2_block
+    else:
+        # no module state is left behind by a serial run
+        pool = worker_pool()
+        task = functools.partial(_d2_block, state=_d2_prepare(setup))
+    with pool:
+        while state['done'] < len(blocks) and state['open'].any():
+            wave = range(state['done'], min(state['done'] + rounds,
+                                            len(blocks)))
+            reach = state['eps'][state['open']].max()
+            jobs = [(blocks[b], reach) for b in wave]
+            for b, histogram in zip(wave, pool.map(task, jobs)):
+                if not state['open'].any():
+                    break
+                scales = state['open']
+                state['found'][:, scales] += histogram[:, scales]
+                state['pairs'][scales] += np.maximum(blocks[b] - t, 0).sum()
+                state['done'] = b + 1
+                if N:
+                    state['open'] = scales & (state['found'][-1] < N)
+            yield state
+
+
+def _blocks(order, block):
+
+    '''
+    The reference points in the given order, split into blocks of at
+    most block points. The first blocks are small (16, 32, ...), since
+    the large length scales are usually closed after a few reference
+    points.
+
+    '''
+
+    bounds = [0]
+    while bounds[-1] < len(order):
+        bounds.append(bounds[-1] + min(block, 16 << (len(bounds) - 1)))
+    return [order[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def _d2_result(state):
+
+    eps = state['eps']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        c2 = state['found'] / np.maximum(state['pairs'], 1).astype(float)
+        logc = np.log(np.where(c2 > 0, c2, np.nan))
+        d2 = np.gradient(logc, np.log(eps), axis=1) if len(eps) > 1 \
+            else np.full_like(c2, np.nan)
+        h2 = np.full_like(c2, np.nan)
+        h2[:-1] = logc[:-1] - logc[1:]
+    return eps, c2, d2, h2
+
+
+# the state of d2 in a worker process, see _d2_setup
+_d2_state = {}
+
+
+def _d2_setup(setup):
+
+    '''
+    Keep the data and the box indices of d2 in the worker process.
+
+    '''
+
+    _d2_state.update(_d2_prepare(setup))
+
+
+def _d2_prepare(setup):
+
+    '''
+    The data and the box indices needed by _d2_block.
+
+    '''
+
+    series, components, lags, d, t, size, R, r, n = setup
+    coordinates = [(lag, component) for lag in range(lags)
+                   for component in range(components)]
+    first = series[:size, :1]
+    if len(coordinates) > 1:
+        lag, component = coordinates[1]
+        second = np.column_stack([series[:size, 0],
+                                  series[lag * d:lag * d + size, component]])
+    else:
+        second = None
+    return dict(
+        series=series, coordinates=coordinates, d=d, t=t, R=R,
+        scale=(n - 1) / np.log(float(r) / R) if n > 1 else 0.0, n=n,
+        first=BoxIndex(first),
+        second=None if second is None else BoxIndex(second))
+
+
+def _d2_block(job, state=None):
+
+    '''
+    Logarithmic histograms of the pair distances of a block of
+    reference points, one row per dimension. The state is that of the
+    worker process unless given.
+
+    '''
+
+    refs, reach = job
+    if state is None:
+        state = _d2_state
+    series, d, t = state['series'], state['d'], state['t']
+    coordinates = state['coordinates']
+    histogram = np.zeros((len(coordinates), state['n']), dtype=np.int64)
+
+    def count(row, dist):
+        if state['n'] == 1:
+            # the only length scale is R
+            histogram[row, 0] += np.count_nonzero(dist < state['R'])
+            return
+        with np.errstate(divide='ignore'):
+            u = np.log(dist / state['R']) * state['scale']
+        bins = np.minimum(np.ceil(u) - 1, state['n'] - 1)
+        bins = bins[bins >= 0].astype(np.int64)
+        histogram[row] += np.bincount(bins, minlength=state['n'])
+
+    # each pair (i, j) once, with j < i - t
+    earlier = np.maximum(refs - t, 0)
+    for _, _, dist in state['first'].pairs(reach, times=refs, limit=earlier):
+        count(0, dist)
+    if state['second'] is not None:
+        for q, j, dist in state['second'].pairs(reach, times=refs,
+                                                limit=earlier):
+            i = refs[q]
+            count(1, dist)
+            for row in range(2, len(coordinates)):
+                lag, component = coordinates[row]
+                shift = lag * d
+                step = series[i + shift, component] - series[j + shift,
+                                                             component]
+                dist = np.maximum(dist, np.abs(step))
+                near = dist < reach
+                i, j, dist = i[near], j[near], dist[near]
+                count(row, dist)
+    # pairs closer than eps[k] are those in the bins k, ..., n-1
+    return histogram[:, ::-1].cumsum(axis=1)[:, ::-1]
+
+
+
+def c1(data, m=2, M=10, d=1, t=0, n=100, resolution=2, K=100, l=None, x=0,
+       workers=None, block=64, seed=0):
+
     '''
     Fixed mass estimation of C1 (information dimension)
 
@@ -431,12 +894,129 @@ def c1():
     kernel correlation sum does not apply to the information
     dimension. See also the example below.
 
+
+    Python usage
+
+    data is a 1-D array or a 2-D array with one column per component,
+    resolution the number of masses per octave (-#). The coordinates
+    of the delay vectors are taken in the order of d2 (all components
+    at lag 0, then at lag d, ...). Returns radius, with one row per
+    embedding dimension m, ..., M, and mass, both for the masses
+    2**(-1/resolution), 2**(-2/resolution), ... down to 1/N. The
+    radius is the geometric mean over the reference points of the
+    distance to the k-th nearest neighbour among n points.
+
+    The subsequences of n points are the first n points of one random
+    order of all points, so that the subsequences are nested. For
+    every dimension and reference point, the neighbours are searched
+    only twice: the nearest ones among all points with the box index,
+    and all points of the shortest subsequences directly. Every
+    (k, n) is then answered from these two lists sorted by distance,
+    by counting the neighbours that belong to the subsequence. The
+    blocks of block reference points are shared by a pool of workers
+    threads.
+
     '''
 
-    raise NotImplementedError
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if series.ndim == 1:
+        series = series[:, None]
+    components = series.shape[1]
+    size = len(series) - ((M - 1) // components) * d
+    if M < 2 or m < 1 or m > M:
+        raise ValueError('need 1 <= m <= M and M >= 2')
+    if size <= 2 * (t + 1) + K:
+        raise ValueError('time series too short')
+    coordinates = np.column_stack([
+        series[(q // components) * d:(q // components) * d + size,
+               q % components] for q in range(M)])
+
+    random = np.random.RandomState(seed)
+    references = random.choice(size, min(n, size), replace=False)
+    rank = np.empty(size, dtype=np.int64)
+    rank[random.permutation(size)] = np.arange(size)
+
+    # masses k/n: n as small as possible with k <= K
+    ks, ns = [], []
+    step = 1
+    while True:
+        mass = 2.0 ** (-step / float(resolution))
+        if mass * size < 1:
+            break
+        k = min(K, int(round(mass * size)))
+        ks.append(k)
+        ns.append(min(size, int(round(k / mass))))
+        step += 1
+    ks, ns = np.array(ks), np.array(ns)
+    # the K-th nearest member of a subsequence of n points is found at
+    # about position K*size/n of the list of all nearest points
+    length = int(min(size - 1, max(2 * K, 2 * np.sqrt(K * size))))
+    small = min(size, int(np.ceil(2.0 * K * size / length)))
+
+    radius = np.zeros((M - m + 1, len(ks)))
+    for dimension in range(m, M + 1):
+        vectors = coordinates[:, :dimension]
+        index = BoxIndex(vectors)
+
+        def job(refs):
+            near, _ = index.knn(length, times=refs, window=t)
+            return _c1_radii(vectors, refs, near, rank, small, ks, ns, t)
+
+        blocks = [references[lo:lo + block]
+                  for lo in range(0, len(references), block)]
+        logs = np.concatenate(parallel_map(job, blocks, workers))
+        with np.errstate(divide='ignore'):
+            logs = np.log(logs)
+        logs[np.isinf(logs)] = np.nan
+        radius[dimension - m] = np.exp(np.nanmean(logs, axis=0))
+    return radius, ks / ns.astype(float)
+
+
+def _c1_radii(vectors, refs, near, rank, small, ks, ns, t):
 
+    '''
+    Distance of each reference point to its k-th nearest neighbour
+    among the first n points of the random order, for every (k, n).
+
+    '''
 
-def lyap_spec():
+    here = vectors[refs]
+    # all points of the shortest subsequences
+    members = np.nonzero(rank < small)[0]
+    dist = np.abs(here[:, None, :] - vectors[members][None, :, :]).max(axis=2)
+    dist[np.abs(refs[:, None] - members[None, :]) <= t] = np.inf
+    order = np.argsort(dist, axis=1)
+    short = (np.take_along_axis(dist, order, axis=1), rank[members][order])
+    # the nearest points of all
+    found = near >= 0
+    near = np.maximum(near, 0)
+    far = np.abs(here[:, None, :] - vectors[near]).max(axis=2)
+    long = (np.where(found, far, np.inf),
+            np.where(found, rank[near], len(rank)))
+
+    radii = np.empty((len(refs), len(ks)))
+    for column, (k, n) in enumerate(zip(ks, ns)):
+        dist, ranks = short if n <= small else long
+        inside = np.cumsum(ranks < n, axis=1)
+        hit = inside[:, -1] >= k
+        position = np.argmax(inside >= k, axis=1)
+        radii[:, column] = np.where(hit, dist[np.arange(len(refs)), position],
+                                    np.nan)
+        for row in np.nonzero(~hit)[0]:
+            # the list of nearest points was too short: all members
+            others = np.nonzero((rank < n) & (np.abs(np.arange(len(rank))
+                                                     - refs[row]) > t))[0]
+            away = np.abs(vectors[others] - here[row]).max(axis=1)
+            radii[row, column] = np.partition(away, k - 1)[k - 1] \
+                if len(away) >= k else np.nan
+    return radii
+
+
+
+def lyap_spec(data, m=(1, 2), d=1, r=None, f=1.2, k=30, n=None, I=False,
+              l=None, x=0, checkpoint=None, interval=10.0):
 
     '''
     Lyapunov spectra
@@ -495,12 +1075,152 @@ def lyap_spec():
 
     Output is written every 10 seconds (real time), approximately.
 
+
+    Python usage
+
+    data is a 1-D array or a 2-D array with one column per component,
+    m the pair (components, embedding dimension). Returns the number
+    of iterations, the exponents in decreasing order (per time step,
+    natural logarithm), the average forecast error of the local linear
+    model (relative to the standard deviation of the data), the
+    average neighbourhood size and the Kaplan-Yorke dimension.
+
+    Use lyap_spec_snapshots to see the estimates every interval
+    seconds while the program is running. With checkpoint, the name
+    of a file, the state of the estimate is saved there every interval
+    seconds, and a killed run resumes from it.
+
     '''
 
-    raise NotImplementedError
+    for result in lyap_spec_snapshots(data, m, d, r, f, k, n, I, l, x,
+                                      checkpoint, interval):
+        pass
+    return result
+
+
+def lyap_spec_snapshots(data, m=(1, 2), d=1, r=None, f=1.2, k=30, n=None,
+                        I=False, l=None, x=0, checkpoint=None,
+                        interval=10.0):
+
+    '''
+    Lyapunov spectrum of lyap_spec while it is computed
+
+    Generates the results of lyap_spec for the iterations done so far
+    about every interval seconds (real time) and the final result last.
+    With checkpoint, the state (the current point, orthonormal frame
+    and sums) is saved to that file with every snapshot; if the file
+    exists when starting, the iteration continues from there. The file
+    remembers the data and the options; resuming with different ones
+    is an error.
+
+    '''
+
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if I:
+        series = series[::-1]
+    if series.ndim == 1:
+        series = series[:, None]
+    vectors = delay(series, m, d)
+    dimension = int(np.prod(vectors.shape[1:]))
+    steps = len(vectors) - 1
+    if n is not None:
+        steps = min(n, steps)
+    if r is None:
+        r = float(np.max(np.ptp(series, axis=0))) / 1000.0 or 1.0
+    scale = series.std(axis=0).mean() or 1.0
+    index = BoxIndex(vectors)
+
+    key = _fingerprint(data, m, d, r, f, k, n, I, l, x)
+    state = _load_checkpoint(checkpoint, key)
+    if state is None:
+        state = dict(done=0, frame=np.eye(dimension),
+                     sums=np.zeros(dimension), error=0.0, size=0.0)
+    else:
+        state['done'] = int(state['done'])
+
+    last = time.time()
+    block = 256
+    while state['done'] < steps:
+        refs = np.arange(state['done'], min(state['done'] + block, steps))
+        # exactly the k nearest neighbours whose image is known
+        near, dist = index.knn(k, eps=r, times=refs, window=0,
+                               limit=len(vectors) - 1, factor=f)
+        # the fits are independent, only the QR chain is sequential
+        jacobians, errors = _local_linear(vectors, refs, near)
+        sizes = np.where(np.isfinite(dist), dist, 0.0).max(axis=1)
+        for row, point in enumerate(refs):
+            frame, upper = np.linalg.qr(jacobians[row].dot(state['frame']))
+            state['frame'] = frame
+            state['sums'] = state['sums'] + np.log(np.abs(np.diag(upper)))
+            state['error'] += errors[row] / scale
+            state['size'] += sizes[row]
+            state['done'] = point + 1
+            if interval is not None and time.time() - last >= interval:
+                _save_checkpoint(checkpoint, key, state)
+                yield _lyap_spec_result(state)
+                last = time.time()
+    _save_checkpoint(checkpoint, key, state)
+    yield _lyap_spec_result(state)
+
+
+def _local_linear(vectors, points, near):
+
+    '''
+    Jacobians of the local linear fits of the images of the neighbours
+    (a row of near per point, -1 for missing neighbours) and the rms
+    errors of their forecasts of the images of points.
 
+    '''
+
+    used = (near >= 0)[..., None].astype(float)
+    near = np.maximum(near, 0)
+    before = take(vectors, near)
+    after = take(vectors, near + 1)
+    counts = used.sum(axis=1)
+    centre = (before * used).sum(axis=1) / counts
+    image = (after * used).sum(axis=1) / counts
+    # missing neighbours become zero rows, which do not change the fit
+    before = (before - centre[:, None]) * used
+    after = (after - image[:, None]) * used
+    cutoff = np.finfo(float).eps * max(near.shape[1], before.shape[2])
+    solution = np.matmul(np.linalg.pinv(before, rcond=cutoff), after)
+    here = take(vectors, points[:, None])[:, 0]
+    actual = take(vectors, points[:, None] + 1)[:, 0]
+    forecast = image + np.matmul((here - centre)[:, None], solution)[:, 0]
+    errors = np.sqrt(np.mean((forecast - actual) ** 2, axis=1))
+    return np.swapaxes(solution, 1, 2), errors
+
+
+def _lyap_spec_result(state):
+
+    done = max(state['done'], 1)
+    exponents = np.sort(state['sums'] / done)[::-1]
+    return (int(state['done']), exponents, state['error'] / done,
+            state['size'] / done, _kaplan_yorke(exponents))
+
+
+def _kaplan_yorke(exponents):
+
+    '''
+    Kaplan-Yorke dimension of exponents in decreasing order.
 
-def box_count():
+    '''
+
+    partial = np.cumsum(exponents)
+    positive = np.nonzero(partial >= 0)[0]
+    if not len(positive):
+        return 0.0
+    j = positive[-1]
+    if j + 1 == len(exponents):
+        return float(len(exponents))
+    return j + 1 + partial[j] / abs(exponents[j + 1])
+
+
+
+def box_count(data, M=(1, 10), d=1, Q=2.0, R=None, r=None, n=20, l=None,
+              x=0):
 
     '''
     Renyi entropies
@@ -548,16 +1268,110 @@ def box_count():
 
     The slope of the second line gives an estimate of DQ(m,epsilon).
 
+
+    Python usage
+
+    data is a 1-D array or a 2-D array with one column per component,
+    M the pair (components, lags), Q one order or a sequence of
+    orders. Returns eps (decreasing), the entropies HQ and the
+    differential entropies, with one row per embedding dimension 1,
+    ..., components*lags (coordinates in the order of d2) and one
+    column per eps; with a sequence of orders, both have one more
+    leading axis for the orders. Natural logarithms.
+
+    The data are quantised only once, into boxes of the smallest size
+    r. The boxes of the larger sizes r * 2**s are found by shifting
+    these box numbers s bits to the right, so that the eps values are
+    r * 2**(j/P) with P quantisations, P the whole number of eps values
+    per octave closest to the one requested by n. The boxes of
+    dimension m+1 are those of dimension m with one coordinate
+    appended to a 64 bit key; when the bits run out, the occupied
+    boxes are numbered first. Only occupied boxes are ever stored.
+
     '''
 
-    raise NotImplementedError
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if series.ndim == 1:
+        series = series[:, None]
+    components, lags = M
+    series = series[:, :components]
+    if series.shape[1] < components:
+        raise ValueError('data has only %d components' % series.shape[1])
+    size = len(series) - (lags - 1) * d
+    if size < 1:
+        raise ValueError('time series too short')
+    lower = series.min(axis=0)
+    interval = float(np.max(series.max(axis=0) - lower)) or 1.0
+    if R is None:
+        R = interval
+    if r is None:
+        r = R / 1000.0
+    octaves = np.log2(float(R) / r)
+    phases = max(1, int(round((n - 1) / octaves))) if octaves > 0 else 1
+
+    orders = np.atleast_1d(np.asarray(Q, dtype=float))
+    eps, entropy = [], []
+    for phase in range(phases):
+        size0 = r * 2.0 ** (phase / float(phases))
+        shifts = int(np.floor(np.log2(float(R) / size0) + 1e-9)) + 1
+        if shifts < 1:
+            continue
+        boxes = np.floor((series - lower) / size0).astype(np.int64)
+        width = max(1, int(boxes.max()).bit_length())
+        for shift in range(shifts):
+            eps.append(size0 * 2.0 ** shift)
+            entropy.append(_renyi(boxes >> shift, width - shift, lags, d,
+                                  size, orders))
+    order = np.argsort(eps)[::-1]
+    eps = np.array(eps)[order]
+    # orders x dimensions x eps
+    entropy = np.stack(entropy, axis=-1)[..., order]
+    differential = entropy.copy()
+    differential[:, 1:] -= entropy[:, :-1]
+    if np.ndim(Q) == 0:
+        return eps, entropy[0], differential[0]
+    return eps, entropy, differential
+
+
+def _renyi(boxes, width, lags, d, size, orders):
+
+    '''
+    Renyi entropies of the occupied boxes for every dimension, with
+    one coordinate appended to the box keys per dimension.
+
+    '''
+
+    components = boxes.shape[1]
+    keys = np.zeros(size, dtype=np.int64)
+    used = 0
+    entropy = np.empty((len(orders), components * lags))
+    for dimension in range(components * lags):
+        lag, component = divmod(dimension, components)
+        if used + width > 63:
+            # number the occupied boxes to free the bits
+            keys = np.unique(keys, return_inverse=True)[1].ravel()
+            used = max(1, int(keys.max()).bit_length())
+        keys = (keys << width) | boxes[lag * d:lag * d + size, component]
+        used += width
+        p = np.unique(keys, return_counts=True)[1] / float(size)
+        for row, q in enumerate(orders):
+            if q == 1:
+                entropy[row, dimension] = -np.sum(p * np.log(p))
+            else:
+                entropy[row, dimension] = np.log(np.sum(p ** q)) / (1 - q)
+    return entropy
+
 
 
 # def zeroth():
 from nonlinear_prediction import zeroth
 
 
-def nstep():
+def nstep(data, m=(1, 2), d=1, L=1000, k=30, r=None, f=1.2,
+          zero_order=False, l=None, x=0, members=1, noise=0.0, seed=0,
+          index=None):
 
     '''
     Locally linear prediction on multivariate time series
@@ -595,9 +1409,91 @@ def nstep():
     -0        perform a zeroth order fit           not set (local linear)
               instead of a local linear one
     ----------------------------------------------------------------------
+
+
+    Python usage
+
+    data is a 1-D array or a 2-D array with one column per component,
+    m the pair (components, lags), zero_order the option -0 (named so
+    as not to hide zeroth). Returns the L forecasted values (one row
+    per step and one column per component, or a 1-D array for scalar
+    data).
+
+    With members, an ensemble of that many trajectories is iterated
+    at once, starting from the last points of the series plus
+    gaussian noise of noise times the standard deviation of each
+    component (seeded by seed); the result then has one more leading
+    axis for the members. The box index of the delay vectors is built
+    once (or passed as index, built from delay(data, m, d)), and
+    every step is one batched radius growth query for all members,
+    followed by the fits of all members at once.
+
     '''
 
-    raise NotImplementedError
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    scalar = series.ndim == 1
+    if scalar:
+        series = series[:, None]
+    components, lags = m
+    series = series[:, :components]
+    vectors = delay(series, m, d)
+    if index is None:
+        index = BoxIndex(vectors)
+    if r is None:
+        r = float(np.max(np.ptp(series, axis=0))) / 1000.0 or 1.0
+    span = (lags - 1) * d + 1
+    usable = len(vectors) - 1
+    if usable < k:
+        raise ValueError('time series too short')
+    images = series[span:]
+
+    # the trajectories, starting with the last span points
+    runs = np.empty((members, span + L, components))
+    runs[:, :span] = series[-span:]
+    if noise:
+        random = np.random.RandomState(seed)
+        runs[:, :span] += noise * series.std(axis=0) * random.standard_normal(
+            (members, span, components))
+    for step in range(L):
+        points = runs[:, step:step + span:d].reshape(members, -1)
+        q, j, _, _ = index.grow(k, eps=r, factor=f, points=points,
+                                limit=usable)
+        runs[:, span + step] = _nstep_fit(vectors, images, points, q, j,
+                                          members, zero_order)
+    forecast = runs[:, span:]
+    if scalar:
+        forecast = forecast[..., 0]
+    return forecast if members > 1 else forecast[0]
+
+
+def _nstep_fit(vectors, images, points, q, j, members, zero_order):
+
+    '''
+    Zeroth order or local linear forecasts of points from their
+    neighbours j (pairs grouped by the query q).
+
+    '''
+
+    found = np.bincount(q, minlength=members)
+    if zero_order:
+        total = np.zeros((members, images.shape[1]))
+        starts = (np.cumsum(found) - found)[found > 0]
+        total[found > 0] = np.add.reduceat(images[j], starts, axis=0)
+        with np.errstate(invalid='ignore'):
+            return total / found[:, None]
+    # pad the neighbourhoods to a common size with zero rows
+    rank = np.arange(len(q)) - np.repeat(np.cumsum(found) - found, found)
+    width = points.shape[1] + 1
+    design = np.zeros((members, found.max(), width))
+    targets = np.zeros((members, found.max(), images.shape[1]))
+    design[q, rank, :-1] = take(vectors, j) - points[q]
+    design[q, rank, -1] = 1.0
+    targets[q, rank] = images[j]
+    coefficients = np.matmul(np.linalg.pinv(design), targets)
+    # the forecast at the point itself is the constant term
+    return coefficients[:, -1]
 
 
 # def compare():
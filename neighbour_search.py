@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+'''
+Neighbour search
+
+Box assisted search for neighbours of delay vectors, shared by all the
+programs working with neighbourhoods (zeroth, predict, lazy, nr_lazy,
+ghkss, project, lyap_k, lyap_r, fsle, false_nearest, ...).
+
+The vectors are sorted into a grid of boxes spanned by their first and
+their last coordinate. A neighbour closer than eps can then only be
+found in the boxes surrounding the one of the reference point. Like in
+TISEAN, box numbers are taken modulo the size of the grid, so that the
+memory requirement does not depend on the box size. All distances are
+measured in the maximum norm.
+
+An index is built once for a given series, embedding dimension and
+delay and can then be passed to every program that needs neighbours:
+
+    vectors = delay(data, m=3, d=2)
+    index = BoxIndex(vectors)
+    zeroth(data, m=(1, 3), d=2, index=index)
+    lyap_k(data, m=3, M=3, d=2, index=index)
+    lyap_r(data, m=3, d=2, index=index)
+    fsle(data, m=3, d=2, index=index)
+    false_nearest(data, m=3, M=6, d=2, index=index)
+
+Queries are answered in batches. The reference points are given either
+as time indices of indexed vectors or as arbitrary points. Pairs closer
+in time than a window are discarded, which implements both the Theiler
+window (-t) and the causality window (-C) of the programs: window=0
+only removes the reference point itself, a Theiler window t is
+window=t, a causality window C is window=C-1.
+
+'''
+
+
+import numpy as np
+
+
+# number of coordinates compared at once
+_CHUNK = 1 << 22
+
+
+def _coordinate(vectors, position):
+
+    '''
+    One coordinate of all vectors, also for multivariate (3-D) views.
+
+    '''
+
+    column = vectors[:, position]
+    while column.ndim > 1:
+        column = column[:, position]
+    return column
+
+
+def take(vectors, idx):
+
+    '''
+    The vectors at the (array of) indices idx, copied and flattened to
+    the shape idx.shape + (dimension,), also for multivariate (3-D)
+    delay vectors.
+
+    '''
+
+    idx = np.asarray(idx)
+    dimension = int(np.prod(np.shape(vectors)[1:]))
+    return np.asarray(vectors)[idx].reshape(idx.shape + (dimension,))
+
+
+def _expand(starts, counts):
+
+    '''
+    Concatenation of the ranges start, ..., start+count-1.
+
+    '''
+
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(ends[-1])
+
+
+def window(theiler=0, causal=0):
+
+    '''
+    Exclusion window for a Theiler window -t and a causality window -C.
+
+    '''
+
+    return max(theiler, causal - 1)
+
+
+class BoxIndex(object):
+
+    '''
+    Grid of boxes for the neighbour search
+
+    vectors  (n, ...) array of delay vectors, e.g. the output of
+             phase_space.delay; it is referenced, not copied
+    eps      size of the boxes (data interval / sqrt(n))
+    boxes    number of boxes per side of the grid (sqrt(n), 1024 at most)
+
+    The box size is a compromise; queries with radii much larger than
+    eps have to scan many boxes, queries with radii much smaller
+    compare many pairs which are too far apart.
+
+    '''
+
+    def __init__(self, vectors, eps=None, boxes=None):
+
+        self.vectors = vectors
+        self.size = len(vectors)
+        self.dimension = int(np.prod(vectors.shape[1:]))
+        if self.size == 0:
+            raise ValueError('no vectors to index')
+
+        first = _coordinate(vectors, 0)
+        last = _coordinate(vectors, -1)
+        lower = np.asarray(vectors).min(axis=0)
+        upper = np.asarray(vectors).max(axis=0)
+        self.diameter = float(np.max(upper - lower))
+        self.bounds = (lower.ravel(), upper.ravel())
+        self.origin = (float(first.min()), float(last.min()))
+
+        if boxes is None:
+            boxes = int(min(1024, max(16, np.sqrt(self.size))))
+        if eps is None:
+            if self.dimension == 1:
+                eps = self.diameter / self.size
+            else:
+                eps = self.diameter / np.sqrt(self.size)
+        if not eps > 0:
+            eps = 1.0
+        self.boxes = boxes
+        self.eps = float(eps)
+
+        keys = self._keys(first, last)
+        self.order = np.argsort(keys, kind='stable')
+        self.start = np.searchsorted(keys[self.order],
+                                     np.arange(boxes * boxes))
+        self.count = np.diff(np.append(self.start, self.size))
+
+    def _boxes(self, first, last):
+
+        i = np.floor((first - self.origin[0]) / self.eps).astype(np.int64)
+        j = np.floor((last - self.origin[1]) / self.eps).astype(np.int64)
+        return i, j
+
+    def _keys(self, first, last):
+
+        return self._wrap(*self._boxes(first, last))
+
+    def _wrap(self, i, j):
+
+        if self.dimension == 1:
+            # scalar vectors: a line of boxes instead of the diagonal
+            return i % (self.boxes * self.boxes)
+        return (i % self.boxes) * self.boxes + j % self.boxes
+
+    def _queries(self, points, times):
+
+        '''
+        Number of queries, their times and a function returning their
+        coordinates.
+
+        '''
+
+        if points is None:
+            if times is None:
+                times = np.arange(self.size)
+            times = np.asarray(times)
+            return (len(times), times,
+                    lambda sel: take(self.vectors, times[sel]))
+        points = np.asarray(points)
+        flat = points.reshape(len(points), -1)
+        if flat.shape[1] != self.dimension:
+            raise ValueError('points have dimension %d, index %d'
+                             % (flat.shape[1], self.dimension))
+        if times is not None:
+            times = np.asarray(times)
+        return len(points), times, lambda sel: flat[sel]
+
+    def pairs(self, eps, points=None, times=None, window=-1, limit=None):
+
+        '''
+        The pairs of radius, generated block by block
+
+        Same arguments as radius. Generates blocks of (query, neighbour,
+        distance) arrays in no particular order, so that all pairs can
+        be processed without ever holding them in memory at once.
+
+        '''
+
+        nq, times, coordinates = self._queries(points, times)
+        eps = np.broadcast_to(np.asarray(eps, dtype=float), (nq,))
+        if limit is not None:
+            limit = np.broadcast_to(np.asarray(limit), (nq,))
+        reach = np.minimum(np.ceil(eps / self.eps),
+                           self.boxes * self.boxes).astype(np.int64)
+        # queries with the same reach scan the same pattern of boxes
+        for level in np.unique(reach):
+            members = np.nonzero(reach == level)[0]
+            steps = np.arange(-level, level + 1)
+            if self.dimension == 1:
+                brute = 2 * level + 1 >= self.boxes * self.boxes
+                offsets = [(a, 0) for a in steps]
+            else:
+                brute = 2 * level + 1 >= self.boxes
+                offsets = [(a, b) for a in steps for b in steps]
+            if brute:
+                offsets = [(0, 0)]
+            block = max(1, _CHUNK // (len(offsets) * max(1, self.dimension)))
+            for lo in range(0, len(members), block):
+                sel = members[lo:lo + block]
+                for found in self._block(sel, coordinates(sel), eps[sel],
+                                         offsets, brute, times, window,
+                                         limit):
+                    yield found
+
+    def _block(self, sel, here, eps, offsets, brute, times, window, limit):
+
+        local = np.arange(len(sel))
+        if brute:
+            owner = local
+            starts = np.zeros(len(sel), dtype=np.int64)
+            counts = np.full(len(sel), self.size, dtype=np.int64)
+        else:
+            owner = np.tile(local, len(offsets))
+            i, j = self._boxes(here[:, 0], here[:, -1])
+            offsets = np.asarray(offsets)
+            keys = self._wrap(offsets[:, :1] + i, offsets[:, 1:] + j).ravel()
+            starts = self.start[keys]
+            counts = self.count[keys]
+            used = counts > 0
+            owner, starts, counts = owner[used], starts[used], counts[used]
+        if not len(counts):
+            return
+
+        # split into chunks of about _CHUNK coordinates
+        ends = np.cumsum(counts)
+        per = max(1, _CHUNK // max(1, self.dimension))
+        cuts = np.searchsorted(ends, np.arange(per, ends[-1], per))
+        cuts = np.unique(np.concatenate([[0], cuts, [len(counts)]]))
+        for a, b in zip(cuts[:-1], cuts[1:]):
+            q = np.repeat(owner[a:b], counts[a:b])
+            cand = self.order[_expand(starts[a:b], counts[a:b])]
+            keep = np.ones(len(cand), dtype=bool)
+            if limit is not None:
+                keep &= cand < limit[sel[q]]
+            if times is not None and window >= 0:
+                keep &= np.abs(times[sel[q]] - cand) > window
+            q, cand = q[keep], cand[keep]
+            if not len(q):
+                continue
+            dist = np.abs(here[q] - take(self.vectors, cand)).max(axis=1)
+            close = dist < eps[q]
+            yield sel[q[close]], cand[close], dist[close]
+
+    def radius(self, eps, points=None, times=None, window=-1, limit=None,
+               sort=False):
+
+        '''
+        All indexed vectors closer than eps to each query
+
+        eps      radius of the neighbourhoods, one for all queries or
+                 one per query
+        points   query points ((nq, ...) array), default: the indexed
+                 vectors at times
+        times    time indices of the queries, used for the exclusion
+                 window (default: all indexed vectors if points is None)
+        window   discard pairs with |time - neighbour| <= window
+        limit    only use neighbours with index < limit, e.g. those
+                 whose image is known (one for all or one per query)
+        sort     sort the neighbours of each query by distance
+
+        Returns the three arrays query, neighbour, distance of all
+        pairs. query is the position of the query in the batch; pairs
+        are grouped by ascending query.
+
+        '''
+
+        found = list(self.pairs(eps, points, times, window, limit))
+        if not found:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty.copy(), np.zeros(0)
+        q, j, dist = [np.concatenate(part) for part in zip(*found)]
+        order = np.lexsort((dist, q)) if sort else np.argsort(q, kind='stable')
+        return q[order], j[order], dist[order]
+
+    def grow(self, k, eps=None, factor=1.2, points=None, times=None,
+             window=-1, limit=None):
+
+        '''
+        Neighbourhoods of at least k points by growing the radius
+
+        Starting with eps (default, and if eps is not positive: the box
+        size), the radius of all queries with less than k neighbours is
+        multiplied by factor (> 1) until k neighbours are found, or all
+        vectors are within reach (also of points far from the data).
+        This is the search done by zeroth, nstep, lyap_spec, ghkss, ...
+
+        Returns query, neighbour, distance like radius (sorted by
+        distance) and the final radius of every query.
+
+        '''
+
+        nq, times, _ = self._queries(points, times)
+        if not factor > 1:
+            raise ValueError('the radius must grow by a factor > 1')
+        if eps is None or not eps > 0:
+            eps = self.eps
+        # beyond this radius, all vectors are within reach
+        reach = np.full(nq, self.diameter)
+        if points is not None:
+            points = np.asarray(points)
+            flat = points.reshape(nq, -1)
+            lower, upper = self.bounds
+            reach += np.maximum(np.maximum(lower - flat, flat - upper)
+                                .max(axis=1), 0.0)
+        radii = np.full(nq, float(eps))
+        # points with nan coordinates have no neighbours at all
+        pending = np.nonzero(~np.isnan(reach))[0]
+        empty = np.zeros(0, dtype=np.int64)
+        found = [(empty, empty, np.zeros(0))]
+        while len(pending):
+            final = radii[pending] > reach[pending]
+            q, j, dist = self.radius(
+                radii[pending[0]],
+                points=None if points is None else points[pending],
+                times=None if times is None else times[pending],
+                window=window, limit=limit)
+            counts = np.bincount(q, minlength=len(pending))
+            done = (counts >= k) | final
+            keep = done[q]
+            found.append((pending[q[keep]], j[keep], dist[keep]))
+            pending = pending[~done]
+            radii[pending] *= factor
+
+        q, j, dist = [np.concatenate(part) for part in zip(*found)]
+        order = np.lexsort((dist, q))
+        return q[order], j[order], dist[order], radii
+
+    def knn(self, k, eps=None, points=None, times=None, window=-1,
+            limit=None, factor=2.0):
+
+        '''
+        The k nearest neighbours of each query
+
+        Returns two (nq, k) arrays with the neighbours sorted by
+        distance and their distances. If less than k neighbours exist,
+        the missing entries are -1 and inf.
+
+        '''
+
+        q, j, dist, _ = self.grow(k, eps=eps, factor=factor, points=points,
+                                  times=times, window=window, limit=limit)
+        nq = len(points) if points is not None else (
+            self.size if times is None else len(times))
+        return _first(q, j, dist, nq, k)
+
+
+def _first(q, j, dist, nq, k):
+
+    '''
+    The first k pairs of each query as (nq, k) arrays.
+
+    '''
+
+    counts = np.bincount(q, minlength=nq)
+    rank = np.arange(len(q)) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = rank < k
+    idx = np.full((nq, k), -1, dtype=np.int64)
+    far = np.full((nq, k), np.inf)
+    idx[q[keep], rank[keep]] = j[keep]
+    far[q[keep], rank[keep]] = dist[keep]
+    return idx, far
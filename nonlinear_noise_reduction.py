@@ -29,6 +29,112 @@ http://www.mpipks-dresden.mpg.de/~tisean/TISEAN_2.1/docs/chaospaper/node22.html
 '''
 
 
+import numpy as np
+
+from neighbour_search import BoxIndex
+from phase_space import delay
+
+
+def _series(data, l, x):
+
+    data = np.array(data, dtype=float)[x:]
+    if l is not None:
+        data = data[:l]
+    return data
+
+
+def _spread(corrections, d, length):
+
+    '''
+    Average the corrections of all delay vectors containing a sample.
+
+    corrections has one row per delay vector and one column per
+    coordinate. Samples not covered by any vector are not corrected.
+
+    '''
+
+    n, m = corrections.shape
+    times = (np.arange(n)[:, None] + d * np.arange(m)).ravel()
+    total = np.bincount(times, weights=corrections.ravel(),
+                        minlength=length)
+    covered = np.bincount(times, minlength=length)
+    return total / np.maximum(covered, 1)
+
+
+def _neighbour_mean(series, q, j, n, coordinates, d):
+
+    '''
+    Average of the given coordinates over each neighbourhood.
+
+    '''
+
+    found = np.bincount(q, minlength=n)
+    mean = np.empty((n, len(coordinates)))
+    for column, k in enumerate(coordinates):
+        mean[:, column] = np.bincount(q, weights=series[j + k * d],
+                                      minlength=n)
+    return mean / found[:, None], found
+
+
+def _projection(vectors, q, j, weights, dimension):
+
+    '''
+    Local projective corrections of all vectors
+
+    q, j are the neighbour pairs grouped by q, vectors without
+    neighbours must not be among the queries. The correction moves each
+    vector onto the dimension-dimensional linear manifold through the
+    centre of mass of its neighbourhood, spanned by the leading
+    eigenvectors of the neighbourhood covariance matrix in the metric
+    given by weights.
+
+    '''
+
+    n, m = vectors.shape
+    corrections = np.zeros((n, m))
+    if not len(q):
+        return corrections
+    # blocks of reference points, about a million matrix entries each
+    ends = np.cumsum(np.bincount(q, minlength=n))
+    step = max(1, 2 ** 20 // m ** 2)
+    cuts = np.searchsorted(ends, np.arange(0, ends[-1], step))
+    cuts = np.unique(np.concatenate([cuts, [n]]))
+    for lo, hi in zip(cuts[:-1], cuts[1:]):
+        a = ends[lo - 1] if lo else 0
+        b = ends[hi - 1]
+        if a == b:
+            continue
+        qq, jj = q[a:b], j[a:b]
+        refs = np.unique(qq)
+        starts = np.searchsorted(qq, refs)
+        found = np.diff(np.append(starts, len(qq)))
+        neighbours = vectors[jj] * weights
+        centre = np.add.reduceat(neighbours, starts) / found[:, None]
+        deviation = neighbours - np.repeat(centre, found, axis=0)
+        covariance = np.add.reduceat(
+            deviation[:, :, None] * deviation[:, None, :], starts)
+        _, vecs = np.linalg.eigh(covariance / found[:, None, None])
+        minor = vecs[:, :, :m - dimension]
+        shift = centre - vectors[refs] * weights
+        corrections[refs] = np.einsum(
+            'nij,nj->ni', minor, np.einsum('nji,nj->ni', minor, shift))
+    return corrections / weights
+
+
+def _metric(m, euclidean):
+
+    '''
+    Weights of the coordinates: the tricky metric of GHKSS suppresses
+    corrections of the first and the last coordinate.
+
+    '''
+
+    weights = np.ones(m)
+    if not euclidean and m > 2:
+        weights[0] = weights[-1] = 1000.0
+    return weights
+
+
 def makenoise():
 
     '''
@@ -124,7 +230,7 @@ def compare():
     raise NotImplementedError
 
 
-def nr_lazy():
+def nr_lazy(data, m=5, d=1, i=1, r=None, v=None, l=None, x=0):
 
     '''
     Simple nonlinear noise reduction
@@ -161,12 +267,26 @@ def nr_lazy():
     point. If this number is 1, no correction is done at all for this
     point.
 
+    Returns the filtered series after i iterations.
+
     '''
-    
-    raise NotImplementedError
+
+    series = _series(data, l, x)
+    if r is None:
+        r = (series.max() - series.min()) / 1000.0 or 1.0
+    if v is not None:
+        r = v * series.std()
+
+    for _ in range(i):
+        vectors = delay(series, m, d)
+        q, j, _ = BoxIndex(vectors, r).radius(r)
+        mean, found = _neighbour_mean(series, q, j, len(vectors),
+                                      range(m), d)
+        series = series + _spread(mean - vectors, d, len(series))
+    return series
 
 
-def lazy():
+def lazy(data, m, r=None, v=None, i=1, l=None, x=0):
 
     '''
     Simple nonlinear noise reduction
@@ -200,12 +320,28 @@ def lazy():
     See also nrlazy which corrects more than just the central
     component. You may want to try both.
 
+    Returns the cleaned sequence after i iterations.
+
     '''
 
-    raise NotImplementedError
+    series = _series(data, l, x)
+    if r is None:
+        if v is None:
+            raise ValueError('either r or v must be given')
+        r = v * series.std()
+    centre = m // 2
+
+    for _ in range(i):
+        vectors = delay(series, m)
+        q, j, _ = BoxIndex(vectors, r).radius(r)
+        mean, _ = _neighbour_mean(series, q, j, len(vectors), [centre], 1)
+        series = series.copy()
+        series[centre:centre + len(vectors)] = mean[:, 0]
+    return series
 
 
-def ghkss():
+def ghkss(data, m=5, d=1, q=3, k=30, r=None, i=1, euclidean=False,
+          l=None, x=0):
 
     '''
     Nonlinear noise reduction
@@ -258,12 +394,26 @@ def ghkss():
     many points the correction was unreasonably large and the last
     line shows (v) the file, to which the corrected data was written.
 
+    The option -2 is euclidean=True. Returns the filtered series
+    after i iterations.
+
     '''
 
-    raise NotImplementedError
+    series = _series(data, l, x)
+    if r is None:
+        r = (series.max() - series.min()) / 1000.0 or 1.0
+    weights = _metric(m, euclidean)
+
+    for _ in range(i):
+        vectors = delay(series, m, d)
+        index = BoxIndex(vectors, r)
+        refs, j, _, _ = index.grow(k, eps=r)
+        corrections = _projection(np.asarray(vectors), refs, j, weights, q)
+        series = series + _spread(corrections, d, len(series))
+    return series
 
 
-def project():
+def project(data, m, q, r, k, i=1, l=None, x=0):
 
     '''
     Nonlinear noise reduction
@@ -296,7 +446,21 @@ def project():
         3, 127 (1993); Reprinted in: E. Ott, T. Sauer, and J. A. Yorke,
         eds., Coping With Chaos, Wiley, New York (1994)
 
+    Neighbourhoods with less than k points are not corrected.
+    Returns the cleaned sequence after i iterations.
+
     '''
 
-    raise NotImplementedError
+    series = _series(data, l, x)
+    weights = _metric(m, False)
+
+    for _ in range(i):
+        vectors = delay(series, m)
+        refs, j, _ = BoxIndex(vectors, r).radius(r)
+        found = np.bincount(refs, minlength=len(vectors))
+        keep = found[refs] >= k
+        corrections = _projection(np.asarray(vectors), refs[keep], j[keep],
+                                  weights, q)
+        series = series + _spread(corrections, 1, len(series))
+    return series
 
@@ -22,7 +22,18 @@ Ref: http://www.mpipks-dresden.mpg.de/~tisean/TISEAN_2.1/docs/chaospaper/node16.
 '''
 
 
-def zeroth():
+import itertools
+
+import numpy as np
+
+from neighbour_search import BoxIndex, take, window
+from phase_space import delay
+from utils import parallel_map
+
+
+def zeroth(data, m=(1, 2), d=1, n=None, S=1, k=30, r=None, f=1.2, s=1,
+           C=None, l=None, x=0, exact=False, workers=None, block=4096,
+           index=None):
 
     '''
     Simple nonlinear prediction
@@ -101,16 +112,82 @@ def zeroth():
     the individual forecast error for each component of each reference
     point.
 
+
+    Python usage
+
+    data is a 1-D array or a 2-D array with one column per component,
+    m the pair (components, lags). Returns the relative forecast
+    errors, one row per step 1, ..., s and one column per component.
+
+    By default, the neighbourhoods are the k nearest neighbours of
+    each reference point found by one batched query (r and f are not
+    used). With exact set,
+    the neighbourhoods are grown from r by the factor f as in TISEAN,
+    and all neighbours within the final radius are used. The forecasts
+    of all s steps are averages over the same neighbours and are
+    gathered at once. The blocks of block reference points can be
+    shared by a pool of workers threads. An index of delay(data, m, d)
+    built before can be passed as index.
+
     '''
 
-    raise NotImplementedError
+    series = np.array(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    if series.ndim == 1:
+        series = series[:, None]
+    components, lags = m
+    series = series[:, :components]
+    if C is None:
+        C = s
+    vectors = delay(series, m, d)
+    if index is None:
+        index = BoxIndex(vectors)
+    if r is None:
+        r = float(np.max(np.ptp(series, axis=0))) / 1000.0 or 1.0
+    newest = (lags - 1) * d
+    usable = len(vectors) - s
+    if usable <= 0:
+        raise ValueError('time series too short')
+    references = np.arange(0, usable, S)[:n]
+    # the images of every vector 1, ..., s steps ahead
+    images = delay(series[newest + 1:], (components, s), 1)
+
+    def job(refs):
+        if exact:
+            q, j, _, _ = index.grow(k, eps=r, factor=f, times=refs,
+                                    window=window(causal=C), limit=usable)
+        else:
+            near, _ = index.knn(k, times=refs, window=window(causal=C),
+                                limit=usable)
+            q = np.repeat(np.arange(len(refs)), k)
+            j = near.ravel()
+            q, j = q[j >= 0], j[j >= 0]
+        # the pairs are grouped by reference point
+        found = np.bincount(q, minlength=len(refs))
+        total = np.zeros((len(refs),) + images.shape[1:])
+        starts = (np.cumsum(found) - found)[found > 0]
+        if len(starts):
+            total[found > 0] = np.add.reduceat(images[j], starts, axis=0)
+        with np.errstate(invalid='ignore'):
+            forecast = total / found[:, None, None]
+        return np.nansum((forecast - images[refs]) ** 2, axis=0), \
+            np.sum(found > 0)
+
+    blocks = [references[lo:lo + block]
+              for lo in range(0, len(references), block)]
+    results = parallel_map(job, blocks, workers)
+    squares = sum(result[0] for result in results)
+    count = sum(result[1] for result in results)
+    return np.sqrt(squares / max(count, 1)) / series.std(axis=0)
 
 
 # def predict():
 from surrogate import predict
 
 
-def ll_ar():
+def ll_ar(data, m=2, d=1, i=None, r=None, R=None, f=1.2, s=1, C=None, l=None,
+          x=0, workers=None, block=256):
 
     '''
     Local vs. global linear prediction
@@ -161,12 +238,93 @@ def ll_ar():
       * average number of neighbors found per point
       * variance of the fraction of points for which neighbors were found
 
-    '''
 
-    raise NotImplementedError
+    Python usage
 
+    data is a 1-D array. Returns one row per neighbourhood size with
+    the columns above; the relative forecast error is the rms error
+    divided by the standard deviation of the data, and the last column
+    is the standard deviation of the number of neighbours per point.
+    A local linear model is only fitted with at least 2(m+1)
+    neighbours.
 
-def rbf():
+    Every reference point is searched for only once, with the largest
+    radius R. Each neighbour falls into the shell between two
+    consecutive neighbourhood sizes, and the sums needed for the least
+    squares fit (the cross products of the neighbours relative to the
+    reference point and of their images) are collected per shell. The
+    sums for a neighbourhood size then are cumulative sums over the
+    shells, and every size needs only one small solve. The blocks of
+    block reference points can be shared by a pool of workers threads.
+
+    '''
+
+    series = np.asarray(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    interval = float(series.max() - series.min()) or 1.0
+    if r is None:
+        r = interval / 1000.0
+    if R is None:
+        R = interval
+    if C is None:
+        C = s
+    scales = int(np.floor(np.log(float(R) / r) / np.log(f) + 1e-9)) + 1
+    eps = r * f ** np.arange(scales)
+
+    vectors = delay(series, m, d)
+    index = BoxIndex(vectors)
+    usable = len(vectors) - s
+    if usable <= 0:
+        raise ValueError('time series too short')
+    images = series[(m - 1) * d + s:]
+    references = np.arange(usable)[:i]
+    # coordinates (i, j) of the upper triangle of the normal equations
+    upper = np.triu_indices(m + 1)
+
+    def job(refs):
+        stats = np.zeros((len(refs) * scales, len(upper[0]) + m + 2))
+        for q, j, dist in index.pairs(eps[-1], times=refs,
+                                      window=window(causal=C),
+                                      limit=usable):
+            shell = np.searchsorted(eps, dist, side='right')
+            key = q * scales + shell
+            z = np.column_stack([take(vectors, j) - take(vectors, refs[q]),
+                                 np.ones(len(q))])
+            terms = [z[:, a] * z[:, b] for a, b in zip(*upper)]
+            terms += [z[:, a] * images[j] for a in range(m + 1)]
+            terms += [np.ones(len(q))]
+            for column, weights in enumerate(terms):
+                stats[:, column] += np.bincount(key, weights,
+                                                minlength=len(stats))
+        stats = stats.reshape(len(refs), scales, -1).cumsum(axis=1)
+        normal = np.zeros((len(refs), scales, m + 1, m + 1))
+        normal[..., upper[0], upper[1]] = stats[..., :len(upper[0])]
+        normal[..., upper[1], upper[0]] = stats[..., :len(upper[0])]
+        right = stats[..., len(upper[0]):-1]
+        found = stats[..., -1]
+        coefficients = np.matmul(np.linalg.pinv(normal), right[..., None])
+        # the forecast at the reference point is the constant term
+        error = (coefficients[..., m, 0] - images[refs][:, None]) ** 2
+        fitted = found >= 2 * (m + 1)
+        return (np.where(fitted, error, 0.0).sum(axis=0), fitted.sum(axis=0),
+                np.where(fitted, found, 0.0).sum(axis=0),
+                np.where(fitted, found ** 2, 0.0).sum(axis=0))
+
+    blocks = [references[lo:lo + block]
+              for lo in range(0, len(references), block)]
+    error, count, total, squares = [
+        sum(part) for part in zip(*parallel_map(job, blocks, workers))]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        return np.column_stack([
+            eps, np.sqrt(error / count) / series.std(),
+            count / float(len(references)), mean,
+            np.sqrt(np.maximum(squares / count - mean ** 2, 0.0))])
+
+
+def rbf(data, m=2, d=1, p=10, X=False, s=1, n=None, L=None, l=None, x=0,
+        drift=100, block=4096):
 
     '''
     Radial basis function fit
@@ -220,12 +378,285 @@ def rbf():
     the basis functions used for the model, the forecast errors and if
     the -L flag was set, the predicted points.
 
+
+    Python usage
+
+    data is a 1-D array. Returns the centres, the variance, the
+    coefficients a0, a1, ..., ap, the forecast errors (in sample and
+    out of sample, relative to the standard deviation of the data, nan
+    without out of sample points) and the L predicted values (None
+    without L). s may also be a sequence of steps; then there is one
+    row of coefficients and errors per step.
+
+    The centres start at delay vectors evenly spread over the fit and
+    drift for drift iterations, all pairs of centres at once. The
+    design matrix is never held in memory: the normal equations are
+    accumulated and the errors computed in blocks of block points. The
+    normal equations are factorised once; the coefficients of every
+    step, including the one step model iterated for the L predictions,
+    are then obtained from that factorisation. rbf_model returns the
+    fitted model itself, to get the coefficients of further steps or
+    forecasts of other points without fitting again.
+
     '''
 
-    raise NotImplementedError
+    model = rbf_model(data, m, d, p, X, s, n, l, x, drift, block)
+    steps = np.atleast_1d(s)
+    coefficients = np.array([model.solve(step) for step in steps])
+    errors = np.array([model.errors(step) for step in steps])
+    prediction = None if L is None else model.run(L)
+    if np.ndim(s) == 0:
+        coefficients, errors = coefficients[0], errors[0]
+    return model.centres, model.variance, coefficients, errors, prediction
 
 
-def polynom():
+def rbf_model(data, m=2, d=1, p=10, X=False, s=1, n=None, l=None, x=0,
+              drift=100, block=4096):
+
+    '''
+    The radial basis function model of rbf
+
+    Same options as rbf. Returns the fitted RBFModel, whose normal
+    equations are factorised once: its solve gives the coefficients of
+    any step up to s (the largest of the steps, at least 1), errors the
+    forecast errors and score the forecasts of any delay vectors, each
+    from the same factorisation.
+
+    '''
+
+    series = np.asarray(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    reach = max(int(np.max(s)), 1)
+    span = (m - 1) * d
+    fit = len(series) if n is None else min(n, len(series))
+    vectors = delay(series, m, d)
+    # vectors with a known image for all steps (and for the one step
+    # model of the predictions)
+    inside = fit - span - reach
+    if inside <= p:
+        raise ValueError('not enough points for %d centres' % p)
+
+    centres = take(vectors, np.linspace(0, inside - 1, p).astype(int))
+    if not X:
+        lower, upper = series.min(), series.max()
+        centres = _drift(centres, lower, upper, drift)
+    model = RBFModel(series, m, d, centres, _mean_distance(centres), block)
+    model.fit(inside, reach, np.append(s, 1))
+    return model
+
+
+def _drift(centres, lower, upper, iterations):
+
+    '''
+    Let the centres repel each other like charges, to distribute them
+    more uniformly; each one moves by a hundredth of the data interval
+    per iteration, along the force on it, and stays within the data.
+
+    '''
+
+    centres = centres.copy()
+    step = 0.01 * (upper - lower)
+    rows = max(1, (1 << 22) // (len(centres) * centres.shape[1]))
+    for _ in range(iterations):
+        force = np.zeros_like(centres)
+        for lo in range(0, len(centres), rows):
+            offset = centres[lo:lo + rows, None] - centres[None]
+            distance = np.sqrt((offset ** 2).sum(axis=2))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                weight = np.where(distance > 0, distance ** -3, 0.0)
+            force[lo:lo + rows] = np.einsum('ij,ijk->ik', weight, offset)
+        size = np.sqrt((force ** 2).sum(axis=1))[:, None]
+        np.clip(centres + step * force / np.where(size > 0, size, 1.0),
+                lower, upper, out=centres)
+    return centres
+
+
+def _mean_distance(centres):
+
+    '''
+    Average (euclidean) distance between the centres.
+
+    '''
+
+    total = 0.0
+    rows = max(1, (1 << 22) // (len(centres) * centres.shape[1]))
+    for lo in range(0, len(centres), rows):
+        offset = centres[lo:lo + rows, None] - centres[None]
+        total += np.sqrt((offset ** 2).sum(axis=2)).sum()
+    pairs = len(centres) * (len(centres) - 1)
+    return total / pairs if pairs else 1.0
+
+
+class RBFModel(object):
+
+    '''
+    Radial basis function model of a series
+
+    Gaussian radial basis functions a0 + sum ai exp(-|x-ci|^2/(2 var))
+    of the delay vectors (m, d) of series, fitted by least squares to
+    the images 1, ..., reach steps ahead of the first size vectors (see
+    fit). The normal equations are factorised once; the coefficients
+    of every step are then obtained from that factorisation and kept.
+    Build it with rbf_model.
+
+    '''
+
+    def __init__(self, series, m, d, centres, variance, block=4096):
+
+        self.series = series
+        self.m, self.d = m, d
+        self.centres = centres
+        self.variance = variance
+        self.block = block
+        self.delays = delay(series, m, d)
+        self.span = (m - 1) * d
+
+    def design(self, points):
+
+        '''
+        The rows of the design matrix of points (the constant first).
+
+        '''
+
+        squares = (points ** 2).sum(axis=1)[:, None] \
+            - 2 * points.dot(self.centres.T) \
+            + (self.centres ** 2).sum(axis=1)[None]
+        basis = np.ones((len(points), len(self.centres) + 1))
+        np.exp(-np.maximum(squares, 0.0) / (2 * self.variance),
+               out=basis[:, 1:])
+        return basis
+
+    def _blocks(self, lo, hi):
+
+        '''
+        Generate the time indices and the design matrix of the vectors
+        lo, ..., hi-1, a block at a time.
+
+        '''
+
+        for start in range(lo, hi, self.block):
+            times = np.arange(start, min(start + self.block, hi))
+            yield times, self.design(take(self.delays, times))
+
+    def _images(self, times, steps):
+
+        return self.series[self.span + np.add.outer(times, steps)]
+
+    def fit(self, size, reach, steps=(1,)):
+
+        '''
+        Accumulate the normal equations of the first size vectors (and
+        the right hand sides of the given steps), a block at a time,
+        and factorise them. All vectors with an image reach steps
+        ahead after the first size ones are out of sample.
+
+        '''
+
+        steps = np.asarray(steps)
+        width = len(self.centres) + 1
+        gram = np.zeros((width, width))
+        right = np.zeros((width, len(steps)))
+        for times, basis in self._blocks(0, size):
+            gram += basis.T.dot(basis)
+            right += basis.T.dot(self._images(times, steps))
+        self.size, self.reach = size, reach
+        self.usable = len(self.series) - self.span - reach
+        # eigen decomposition: also for (nearly) singular equations
+        values, self.eigenvectors = np.linalg.eigh(gram)
+        cutoff = values.max() * width * np.finfo(float).eps
+        self.inverse = np.where(values > cutoff, 1.0 / np.where(
+            values > cutoff, values, 1.0), 0.0)
+        self.coefficients = dict(zip(steps.tolist(), self._solve(right).T))
+
+    def _solve(self, right):
+
+        return self.eigenvectors.dot(self.inverse[:, None]
+                                     * self.eigenvectors.T.dot(right))
+
+    def solve(self, step=1):
+
+        '''
+        Coefficients a0, a1, ..., ap of the forecast step steps ahead
+        (step <= reach); those of a new step take one more pass over
+        the fit, but no new factorisation.
+
+        '''
+
+        step = int(step)
+        if step not in self.coefficients:
+            if not 1 <= step <= self.reach:
+                raise ValueError('model fitted for steps 1, ..., %d'
+                                 % self.reach)
+            right = 0.0
+            for times, basis in self._blocks(0, self.size):
+                right = right + basis.T.dot(self._images(times, [step]))
+            self.coefficients[step] = self._solve(right)[:, 0]
+        return self.coefficients[step]
+
+    def score(self, points, step=1):
+
+        '''
+        Forecasts step steps ahead of the points, delay vectors given
+        as an (n, m) array.
+
+        '''
+
+        points = np.asarray(points, dtype=float).reshape(-1, self.m)
+        coefficients = self.solve(step)
+        return np.concatenate([self.design(points[lo:lo + self.block])
+                               .dot(coefficients) for lo in
+                               range(0, len(points), self.block)] or
+                              [np.zeros(0)])
+
+    def errors(self, step=1):
+
+        '''
+        Forecast errors step steps ahead in sample and out of sample,
+        relative to the standard deviation of the series.
+
+        '''
+
+        coefficients = self.solve(step)
+        errors = np.zeros(2)
+        for side, (lo, hi) in enumerate([(0, self.size),
+                                         (self.size, self.usable)]):
+            total = np.float64(0.0)
+            for times, basis in self._blocks(lo, hi):
+                total += ((basis.dot(coefficients)
+                           - self._images(times, step)) ** 2).sum()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                errors[side] = np.sqrt(total / (hi - lo)) \
+                    / self.series.std()
+        return errors
+
+    def run(self, length):
+
+        '''
+        Iterate the one step model from the end of the series.
+
+        '''
+
+        coefficients = self.solve(1)
+        d = self.d
+        span = self.span + 1
+        window = np.empty(span + length)
+        window[:span] = self.series[-span:]
+        offset = np.empty_like(self.centres)
+        squares = np.empty(len(self.centres))
+        for step in range(length):
+            point = window[step:step + span:d]
+            np.subtract(self.centres, point, out=offset)
+            np.square(offset, out=offset)
+            offset.sum(axis=1, out=squares)
+            squares *= -0.5 / self.variance
+            np.exp(squares, out=squares)
+            window[span + step] = coefficients[0] \
+                + squares.dot(coefficients[1:])
+        return window[span:].copy()
+
+
+def polynom(data, m=2, d=1, p=2, n=None, L=None, l=None, x=0):
 
     '''
     Polynomial model
@@ -258,12 +689,22 @@ def polynom():
     The output file contains: The coefficients of the model, the
     forecast errors and if the -L flag was set the predicted points.
 
+
+    Python usage
+
+    data is a 1-D array. Returns the terms (one row of exponents per
+    term, in the convention of polypar), their coefficients, the
+    forecast errors in sample and out of sample (relative to the
+    standard deviation of the data, nan without out of sample points)
+    and the L predicted values (None without L).
+
     '''
 
-    raise NotImplementedError
+    return _polynomial_model(data, m, d, _monomials(m, p), n, L, l, x)
 
 
-def polynomp():
+def polynomp(data, m=2, d=1, n=None, L=1000, p='parameter.pol', l=None,
+             x=0):
 
     '''
     Polynomial model
@@ -304,12 +745,22 @@ def polynomp():
      * next rows: The parameter of the model
      * last rows: the forecasted trajectory
 
+
+    Python usage
+
+    data is a 1-D array, p the name of a parameter file or the terms
+    themselves (one row of exponents per term). Returns the terms,
+    their coefficients, the forecast errors in sample and out of
+    sample (relative to the standard deviation of the data) and the L
+    predicted values, like polynom.
+
     '''
 
-    raise NotImplementedError
+    return _polynomial_model(data, m, d, _terms(p, m), n, L, l, x)
 
 
-def polyback():
+def polyback(data, m=2, d=1, n=None, s=1, final=1, p='parameter.pol', l=None,
+             x=0):
 
     '''
     Polynomial model
@@ -354,12 +805,231 @@ def polyback():
       * third column: out of sample error produced by this polynomial
       * fourth column: the term removed last from the polynomial
 
+
+    Python usage
+
+    data is a 1-D array, p the name of a parameter file or the terms
+    themselves, final the number of terms to reduce to (-#). Returns
+    one row per polynomial (starting with the full one) with the number
+    of terms, the errors in sample and out of sample (relative to the
+    standard deviation of the data) and the position of the term
+    removed last in the full list of terms (-1 for the full
+    polynomial), and the list of the terms of every polynomial.
+
+    The design matrix is built and factorised (QR) only once. The
+    increase of the error caused by removing a term follows from its
+    coefficient and the diagonal of the inverse normal matrix, for all
+    terms at once; after removing the best term, the inverse and the
+    coefficients are downdated, without a new fit.
+
     '''
 
-    raise NotImplementedError
+    terms = _terms(p, m)
+    model, design, targets, inside = _polynomial_fit(data, m, d, terms, n, s,
+                                                     l, x)
+    scale = targets.std()
+    outside, targets = np.array(design[inside:]), targets[inside:]
+    rows = [np.concatenate([[len(terms)], model.errors(
+        outside, targets) / scale, [-1]])]
+    kept = [terms]
+    while len(model.terms) > max(final, 1):
+        worst = np.argmin(model.increases())
+        removed = model.columns[worst]
+        model.remove(worst)
+        rows.append(np.concatenate([[len(model.terms)], model.errors(
+            outside, targets) / scale, [removed]]))
+        kept.append(model.terms)
+    return np.array(rows), kept
+
+
+def _monomials(m, p):
 
+    '''
+    Exponents of all monomials of m variables up to order p, one row
+    per term, by ascending order.
+
+    '''
+
+    return np.fromiter(itertools.chain.from_iterable(polypar_terms(m, p)),
+                       dtype=np.int64, count=m * polypar_size(m, p)
+                       ).reshape(-1, m)
 
-def polypar():
+
+def _terms(p, m):
+
+    '''
+    Terms of a polynomial given as a parameter file or as exponents.
+
+    '''
+
+    if isinstance(p, str) and p.endswith('.npy'):
+        # binary exponents written by polypar, mapped, not read
+        terms = np.load(p, mmap_mode='r')
+    elif isinstance(p, str):
+        terms = np.loadtxt(p, dtype=np.int64, ndmin=2)
+    else:
+        terms = np.asarray(p, dtype=np.int64).reshape(-1, m)
+    if terms.shape[1] != m:
+        raise ValueError('terms have %d variables, not %d'
+                         % (terms.shape[1], m))
+    return terms
+
+
+def _polynomial_fit(data, m, d, terms, n, s, l, x):
+
+    '''
+    The fitted model, its design matrix, the targets and the number of
+    points in sample.
+
+    '''
+
+    series = np.asarray(data, dtype=float)[x:]
+    if l is not None:
+        series = series[:l]
+    span = (m - 1) * d
+    usable = len(series) - span - s
+    if usable <= len(terms):
+        raise ValueError('time series too short')
+    inside = usable if n is None else min(max(n - span - s, 0), usable)
+    # newest coordinate first, like the exponents of polypar
+    regressors = take(delay(series, m, d), np.arange(usable))[:, ::-1]
+    model = _Polynomial(terms)
+    design = model.design(regressors)
+    targets = series[span + s:][:usable]
+    model.fit(design[:inside], targets[:inside])
+    return model, design, targets, inside
+
+
+def _polynomial_model(data, m, d, terms, n, L, l, x):
+
+    model, design, targets, inside = _polynomial_fit(data, m, d, terms, n, 1,
+                                                     l, x)
+    errors = model.errors(design[inside:], targets[inside:]) / targets.std()
+    prediction = None
+    if L is not None:
+        series = np.asarray(data, dtype=float)[x:]
+        if l is not None:
+            series = series[:l]
+        prediction = model.run(series, m, d, L)
+    return terms, model.coefficients.copy(), errors, prediction
+
+
+class _Polynomial(object):
+
+    '''
+    Polynomial model sum ai prod xj^eij, fitted by least squares
+
+    terms    exponents, one row per term, the first column belonging
+             to the newest coordinate
+
+    '''
+
+    def __init__(self, terms):
+
+        self.terms = np.asarray(terms)
+
+    def design(self, regressors):
+
+        '''
+        Column-major design matrix of the rows of regressors.
+
+        '''
+
+        order = self.terms.max() if self.terms.size else 0
+        powers = np.ones((order + 1,) + regressors.shape)
+        for k in range(1, order + 1):
+            powers[k] = powers[k - 1] * regressors
+        design = np.ones((len(regressors), len(self.terms)), order='F')
+        for column, exponents in enumerate(self.terms):
+            for variable, k in enumerate(exponents):
+                if k:
+                    design[:, column] *= powers[k, :, variable]
+        return design
+
+    def fit(self, design, targets):
+
+        '''
+        Least squares fit by one QR factorisation; keeps the inverse
+        normal matrix for the downdates.
+
+        '''
+
+        q, r = np.linalg.qr(design)
+        rinverse = np.linalg.solve(r, np.eye(len(r)))
+        self.coefficients = rinverse.dot(q.T.dot(targets))
+        self.inverse = rinverse.dot(rinverse.T)
+        self.squares = np.sum((design.dot(self.coefficients) - targets) ** 2)
+        self.size = len(targets)
+        self.columns = np.arange(len(self.terms))
+
+    def increases(self):
+
+        '''
+        Increase of the sum of squared errors caused by removing each
+        of the terms.
+
+        '''
+
+        return self.coefficients ** 2 / np.diag(self.inverse)
+
+    def remove(self, k):
+
+        '''
+        Remove the term k from the fit (rank one downdate).
+
+        '''
+
+        column = self.inverse[:, k]
+        self.squares += self.coefficients[k] ** 2 / column[k]
+        self.coefficients = np.delete(
+            self.coefficients - column * self.coefficients[k] / column[k], k)
+        self.inverse = np.delete(np.delete(
+            self.inverse - np.outer(column, column) / column[k], k, axis=0),
+            k, axis=1)
+        self.terms = np.delete(self.terms, k, axis=0)
+        self.columns = np.delete(self.columns, k)
+
+    def errors(self, outside, targets):
+
+        '''
+        rms errors in sample and out of sample (nan if there are no
+        such points); outside holds the rows of the design matrix of
+        all terms of the fit for the points out of sample.
+
+        '''
+
+        full = np.zeros(outside.shape[1])
+        full[self.columns] = self.coefficients
+        residuals = outside.dot(full) - targets
+        with np.errstate(invalid='ignore'):
+            return np.sqrt([self.squares / self.size, np.mean(residuals ** 2)
+                            if len(residuals) else np.nan])
+
+    def run(self, history, m, d, length):
+
+        '''
+        Iterate the model from the end of history.
+
+        '''
+
+        span = (m - 1) * d + 1
+        window = np.empty(span + length)
+        window[:span] = history[-span:]
+        order = self.terms.max() if self.terms.size else 0
+        powers = np.ones((order + 1, m))
+        picks = (self.terms, np.arange(m))
+        values = np.empty(len(self.terms))
+        for step in range(length):
+            # newest coordinate first
+            powers[1] = window[step:step + span:d][::-1]
+            for k in range(2, order + 1):
+                np.multiply(powers[k - 1], powers[1], out=powers[k])
+            np.prod(powers[picks], axis=1, out=values)
+            window[span + step] = values.dot(self.coefficients)
+        return window[span:].copy()
+
+
+def polypar(m=2, p=3, o='parameter.pol'):
 
     '''
     Polynomial model
@@ -391,7 +1061,82 @@ def polypar():
    
     xni1 xn-1i2... xn-m+1id
 
+
+    Python usage
+
+    Writes the terms to the file o, the default parameter file of
+    polynomp and polyback, and returns their number: as text lines like
+    above, or, if the name ends with .npy, as a binary array of
+    unsigned bytes (one row per term) that polynomp and polyback map
+    into memory when given the file name. The terms are generated one
+    by one and never held in memory. polypar_terms generates them
+    without a file, polypar_size gives their number without
+    enumerating them.
+
+    '''
+
+    if o.endswith('.npy'):
+        dtype = np.uint8 if p < 256 else np.uint16
+        size = polypar_size(m, p)
+        terms = np.lib.format.open_memmap(o, mode='w+', dtype=dtype,
+                                          shape=(size, m))
+        chunk = max(1, (1 << 20) // max(m, 1))
+        generator = itertools.chain.from_iterable(polypar_terms(m, p))
+        for lo in range(0, size, chunk):
+            rows = min(chunk, size - lo)
+            terms[lo:lo + rows] = np.fromiter(
+                itertools.islice(generator, rows * m), dtype=dtype,
+                count=rows * m).reshape(rows, m)
+        terms.flush()
+        return size
+    count = 0
+    with open(o, 'w') as output:
+        for exponents in polypar_terms(m, p):
+            output.write(' '.join(str(i) for i in exponents) + '\n')
+            count += 1
+    return count
+
+
+def polypar_size(m=2, p=3):
+
+    '''
+    Number of terms of a polynomial of order p in m variables,
+    binomial(m+p, p), i.e. the number of exponent tuples of polypar.
+
+    '''
+
+    size = 1
+    for k in range(1, p + 1):
+        size = size * (m + k) // k
+    return size
+
+
+def polypar_terms(m=2, p=3):
+
+    '''
+    The exponent tuples (i1, ..., im) of the terms of polypar, by
+    ascending order of the terms and lexicographically within an
+    order, as a generator.
+
+    '''
+
+    for order in range(p + 1):
+        for exponents in _compositions(order, m):
+            yield exponents
+
+
+def _compositions(total, parts):
+
+    '''
+    The tuples of parts non-negative integers summing to total, in
+    lexicographic order.
+
     '''
 
-    raise NotImplementedError
+    if parts == 1:
+        yield (total,)
+        return
+    for first in range(total + 1):
+        for rest in _compositions(total - first, parts - 1):
+            yield (first,) + rest
 
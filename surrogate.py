@@ -23,6 +23,12 @@ section in the introduction paper.
 '''
 
 
+import numpy as np
+
+from neighbour_search import BoxIndex
+from phase_space import delay
+
+
 def surrogates():
 
     '''
@@ -231,7 +237,8 @@ def timerev():
     raise NotImplementedError
 
 
-def predict():
+def predict(data, m=2, d=1, r=None, v=None, s=1, l=None, x=0,
+            index=None):
     
     '''
     Simple nonlinear prediction
@@ -260,6 +267,34 @@ def predict():
     different options, including multivariate data, and xzero, which
     does cross-predictions.
 
+    Returns the predictions, aligned with the data (nan where no
+    prediction was possible), and the rms prediction error. An index
+    of delay(data, m, d) built before can be passed as index.
+
     '''
 
-    raise NotImplementedError
+    data = np.asarray(data, dtype=float)[x:]
+    if l is not None:
+        data = data[:l]
+    if r is None:
+        if v is None:
+            raise ValueError('either r or v must be given')
+        r = v * data.std()
+
+    if index is None:
+        index = BoxIndex(delay(data, m, d), r)
+    shift = (m - 1) * d + s
+    usable = len(data) - shift
+    if usable <= 0:
+        raise ValueError('time series too short')
+
+    q, j, _ = index.radius(r, times=np.arange(usable), window=0,
+                           limit=usable)
+    found = np.bincount(q, minlength=usable)
+    total = np.bincount(q, weights=data[j + shift], minlength=usable)
+
+    prediction = np.full(len(data), np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        prediction[shift:] = total / found
+    error = np.sqrt(np.nanmean((prediction - data) ** 2))
+    return prediction, error
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+'''
+The modules of the package are flat top-level modules; make them
+importable from the tests, and provide the test data.
+
+'''
+
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+
+def _henon(size, a=1.4, b=0.3):
+
+    x, y = 0.1, 0.0
+    points = np.empty((size + 100, 2))
+    for i in range(size + 100):
+        x, y = 1.0 - a * x * x + y, b * x
+        points[i] = x, y
+    return points[100:]
+
+
+@pytest.fixture
+def henon():
+
+    '''
+    Orbits of the Henon map (x, y) after a transient of 100 steps.
+
+    '''
+
+    return _henon
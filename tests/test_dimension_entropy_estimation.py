@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+import numpy as np
+
+from dimension_entropy_estimation import c2_naive, c2t
+
+
+def test_c2t_power_law():
+
+    eps = 2.0 ** -np.arange(6)
+    np.testing.assert_allclose(c2t(eps, eps ** 1.5), 1.5)
+
+
+def test_c2t_vanishing_smallest_scales():
+
+    eps = 2.0 ** -np.arange(6)
+    c2 = np.array([[1.0, 0.3, 0.1, 0.02, 0.0, 0.0],
+                   eps ** 2])
+    estimate = c2t(eps, c2)
+    assert np.isnan(estimate[0, 4:]).all()
+    assert np.isfinite(estimate[0, :4]).all()
+    # at the smallest nonzero scale, the power law of the next interval
+    np.testing.assert_allclose(estimate[0, 3], np.log2(0.1 / 0.02))
+    np.testing.assert_allclose(estimate[1], 2.0)
+
+
+def test_c2_naive_exact(henon):
+
+    series = henon(400)[:, 0]
+    m, M, d, t = 2, 4, 2, 3
+    eps, c2 = c2_naive(series, m=m, M=M, d=d, t=t, tile=64, workers=2)
+    size = len(series) - (M - 1) * d
+    i, j = np.triu_indices(size, t + 1)
+    for row, dimension in enumerate(range(m, M + 1)):
+        vectors = np.column_stack([series[k * d:][:size]
+                                   for k in range(dimension)])
+        dist = np.abs(vectors[i] - vectors[j]).max(axis=1)
+        np.testing.assert_allclose(
+            c2[row], [(dist < e).mean() for e in eps])
+    # down to the smallest distance of the largest dimension
+    assert eps[0] == np.ptp(series)
+    assert eps[-1] > dist.min() >= eps[-1] * 2 ** -0.5
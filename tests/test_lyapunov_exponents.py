@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+import numpy as np
+
+from lyapunov_exponents import fsle, lyap_k, lyap_r
+from neighbour_search import BoxIndex
+from phase_space import delay
+
+
+def _same(a, b):
+
+    for x, y in zip(a, b):
+        np.testing.assert_array_equal(x, y)
+
+
+def test_index(henon):
+
+    series = henon(2000)[:, 0]
+    index = BoxIndex(delay(series, 3, 2))
+    _same(lyap_k(series, m=3, M=3, d=2, index=index),
+          lyap_k(series, m=3, M=3, d=2))
+    np.testing.assert_array_equal(lyap_r(series, m=3, d=2, index=index),
+                                  lyap_r(series, m=3, d=2))
+    _same(fsle(series, m=3, d=2, index=index), fsle(series, m=3, d=2))
+
+
+def test_lyap_r_workers(henon):
+
+    import lyapunov_exponents
+    series = henon(2000)[:, 0]
+    serial = lyap_r(series, m=2, block=300)
+    assert not lyapunov_exponents._lyap_r_state
+    np.testing.assert_array_equal(
+        lyap_r(series, m=2, block=300, workers=2), serial)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+import numpy as np
+
+from multivariate import (box_count, c1, d2, d2_snapshots, lyap_spec,
+                          lyap_spec_snapshots, nstep, xc2, xzero)
+
+
+def _correlation_sum(vectors, eps, t):
+
+    dist = np.abs(vectors[:, None] - vectors[None]).max(axis=-1)
+    i, j = np.triu_indices(len(vectors), t + 1)
+    return np.array([(dist[i, j] < e).mean() for e in eps])
+
+
+def test_d2_normalized_multivariate(henon):
+
+    data = henon(400) * [1.0, 10.0] + [0.0, 5.0]
+    eps, c2, _, _ = d2(data, M=(2, 1), E=True, n=8, N=0)
+    lower = data.min(axis=0)
+    scaled = (data - lower) / (data.max(axis=0) - lower)
+    np.testing.assert_allclose(c2[-1], _correlation_sum(scaled, eps, 0))
+
+
+def test_d2_serial_state(henon):
+
+    import multivariate
+    d2(henon(300)[:, 0], M=(1, 2))
+    assert not multivariate._d2_state
+
+
+def test_xc2_exact(henon):
+
+    data = henon(300)
+    data[:, 1] += 0.01 * np.random.RandomState(0).randn(300)
+    M, d, t = 3, 2, 3
+    eps, xy, xx, yy = xc2(data, M, 10, t, d=d, N=0)
+    size = len(data) - (M - 1) * d
+    time = np.arange(size)
+    apart = np.abs(time[:, None] - time) > t
+
+    def integral(a, b, dimension):
+        u = np.column_stack([a[k * d:k * d + size] for k in range(dimension)])
+        v = np.column_stack([b[k * d:k * d + size] for k in range(dimension)])
+        dist = np.abs(u[:, None] - v[None]).max(axis=2)[apart]
+        return np.array([(dist < e).mean() for e in eps])
+
+    x, y = data.T
+    for row, dimension in enumerate(range(2, M + 1)):
+        np.testing.assert_allclose(
+            xy[row], (integral(x, y, dimension) + integral(y, x, dimension))
+            / 2)
+        np.testing.assert_allclose(xx[row], integral(x, x, dimension))
+        np.testing.assert_allclose(yy[row], integral(y, y, dimension))
+
+
+def test_xzero_pair(henon):
+
+    data = henon(1000)
+    options = dict(m=2, k=20, r=0.05)
+    np.testing.assert_allclose(xzero(data, **options),
+                               xzero(data, channels=[0, 1], **options)[0, 1])
+
+
+
+def _nstep_iterated(series, lags, d, L, k, r, f, zero_order):
+
+    # one point at a time, neighbours by growing the radius
+    vectors = np.column_stack([series[lag * d:][:len(series) - (lags - 1)
+                                                * d] for lag in range(lags)])
+    span = (lags - 1) * d + 1
+    usable = len(vectors) - 1
+    images = series[span:]
+    run = list(series[-span:])
+    for _ in range(L):
+        point = np.array(run[-span::d])
+        dist = np.abs(vectors[:usable] - point).max(axis=1)
+        eps = r
+        while (dist < eps).sum() < k:
+            eps *= f
+        near = np.nonzero(dist < eps)[0]
+        if zero_order:
+            run.append(images[near].mean())
+        else:
+            z = np.column_stack([vectors[near] - point, np.ones(len(near))])
+            run.append(np.linalg.lstsq(z, images[near], rcond=None)[0][-1])
+    return np.array(run[span:])
+
+
+def test_nstep_exact(henon):
+
+    series = henon(1000)[:, 0]
+    for zero_order in (False, True):
+        np.testing.assert_allclose(
+            nstep(series, m=(1, 2), d=1, L=20, k=10, r=0.01,
+                  zero_order=zero_order),
+            _nstep_iterated(series, 2, 1, 20, 10, 0.01, 1.2, zero_order),
+            rtol=1e-8)
+
+
+def test_nstep_constant_series():
+
+    forecast = nstep(np.zeros(300), m=(1, 2), L=3, k=5)
+    np.testing.assert_array_equal(forecast, 0.0)
+
+
+def test_d2_workers(henon):
+
+    data = henon(1500)[:, 0]
+    for N in (0, 500):
+        serial = d2(data, M=(1, 4), n=20, N=N, block=100)
+        pooled = d2(data, M=(1, 4), n=20, N=N, block=100, workers=2)
+        for a, b in zip(serial, pooled):
+            np.testing.assert_array_equal(a, b)
+
+
+def test_d2_single_scale():
+
+    series = np.random.RandomState(0).rand(500)
+    eps, c2, _, _ = d2(series, M=(1, 2), n=1, N=0)
+    np.testing.assert_array_equal(eps, np.ptp(series))
+    vectors = np.column_stack([series[:-1], series[1:]])
+    np.testing.assert_allclose(c2[:, 0], [
+        _correlation_sum(series[:-1, None], eps, 0)[0],
+        _correlation_sum(vectors, eps, 0)[0]])
+
+
+
+def test_lyap_spec_henon(henon):
+
+    # the exponents of the map sum to log 0.3 (constant jacobian)
+    exact = np.array([0.419, np.log(0.3) - 0.419])
+    done, exponents, _, _, dimension = lyap_spec(henon(5000), m=(2, 1))
+    assert done == 4999
+    assert np.abs(exponents - exact).max() < 0.05
+    np.testing.assert_allclose(dimension, 1 - exact[0] / exact[1],
+                               atol=0.02)
+
+
+
+def test_box_count_exact(henon):
+
+    data = henon(2000)
+    components, lags, d = 2, 3, 2
+    orders = (0.0, 1.0, 2.0)
+    # 13 bits per coordinate: the box keys are renumbered
+    R = float(np.ptp(data, axis=0).max())
+    eps, entropy, _ = box_count(data, M=(components, lags), d=d, Q=orders,
+                                r=R / 5000, n=30)
+    size = len(data) - (lags - 1) * d
+    coordinates = np.column_stack([data[lag * d:][:size, c]
+                                   for lag in range(lags)
+                                   for c in range(components)])
+    lower = np.tile(data.min(axis=0), lags)
+    for column, e in enumerate(eps):
+        boxes = np.floor((coordinates - lower) / e).astype(int)
+        for dimension in range(components * lags):
+            p = np.unique(boxes[:, :dimension + 1], axis=0,
+                          return_counts=True)[1] / float(size)
+            exact = [np.log(len(p)), -np.sum(p * np.log(p)),
+                     -np.log(np.sum(p ** 2))]
+            np.testing.assert_allclose(entropy[:, dimension, column], exact,
+                                       rtol=1e-12, atol=1e-12)
+
+
+def test_c1_exact(henon):
+
+    series = henon(600)[:, 0]
+    m, M, t, K = 1, 3, 2, 8
+    radius, mass = c1(series, m=m, M=M, t=t, n=40, K=K, block=16,
+                      workers=2)
+    size = len(series) - M + 1
+    random = np.random.RandomState(0)
+    references = random.choice(size, 40, replace=False)
+    rank = np.empty(size, dtype=int)
+    rank[random.permutation(size)] = np.arange(size)
+    masses = 2.0 ** (-np.arange(1, len(mass) + 1) / 2.0)
+    ks = np.minimum(K, np.round(masses * size)).astype(int)
+    ns = np.minimum(size, np.round(ks / masses)).astype(int)
+    np.testing.assert_allclose(mass, ks / ns.astype(float))
+    assert masses[-1] * size >= 1 > masses[-1] * size / 2 ** 0.5
+    for row, dimension in enumerate(range(m, M + 1)):
+        vectors = np.column_stack([series[k:][:size]
+                                   for k in range(dimension)])
+        logs = np.zeros((len(references), len(ks)))
+        for i, ref in enumerate(references):
+            dist = np.abs(vectors - vectors[ref]).max(axis=1)
+            for column, (k, n) in enumerate(zip(ks, ns)):
+                members = (rank < n) & (np.abs(np.arange(size) - ref) > t)
+                logs[i, column] = np.log(np.sort(dist[members])[k - 1])
+        np.testing.assert_allclose(radius[row], np.exp(logs.mean(axis=0)))
+
+
+def test_checkpoint_resume(henon, tmp_path):
+
+    data = henon(1500)[:, 0]
+    options = dict(M=(1, 3), n=20, N=400, block=100)
+    path = str(tmp_path / 'd2.npz')
+    # killed after two blocks of reference points
+    run = d2_snapshots(data, checkpoint=path, interval=0, **options)
+    for _ in range(3):
+        next(run)
+    run.close()
+    with np.load(path) as saved:
+        assert saved['done'] == 2
+    resumed = list(d2_snapshots(data, checkpoint=path, **options))
+    for a, b in zip(resumed[-1], d2(data, **options)):
+        np.testing.assert_array_equal(a, b)
+
+    path = str(tmp_path / 'lyap.npz')
+    run = lyap_spec_snapshots(data, m=(1, 2), n=400, checkpoint=path,
+                              interval=0)
+    for _ in range(100):
+        next(run)
+    run.close()
+    with np.load(path) as saved:
+        assert saved['done'] == 100
+    resumed = lyap_spec(data, m=(1, 2), n=400, checkpoint=path)
+    for a, b in zip(resumed, lyap_spec(data, m=(1, 2), n=400)):
+        np.testing.assert_allclose(a, b, rtol=1e-10)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+import numpy as np
+
+from neighbour_search import BoxIndex, take
+from phase_space import delay
+
+
+def _brute(vectors, points, times, eps, window, limit):
+
+    flat = np.asarray(vectors).reshape(len(vectors), -1)
+    dist = np.abs(points[:, None] - flat[None]).max(axis=2)
+    close = dist < np.broadcast_to(eps, (len(points),))[:, None]
+    others = np.arange(len(flat))
+    if times is not None and window >= 0:
+        close &= np.abs(times[:, None] - others) > window
+    if limit is not None:
+        close &= others < limit
+    q, j = np.nonzero(close)
+    return q, j, dist[q, j]
+
+
+def _compare(index, eps, points=None, times=None, window=-1, limit=None):
+
+    flat = np.asarray(index.vectors).reshape(index.size, -1)
+    queries = flat[times] if points is None else points
+    q, j, dist = index.radius(eps, points=points, times=times,
+                              window=window, limit=limit)
+    order = np.lexsort((j, q))
+    expected = _brute(index.vectors, queries, times, eps, window, limit)
+    np.testing.assert_array_equal(q[order], expected[0])
+    np.testing.assert_array_equal(j[order], expected[1])
+    np.testing.assert_array_equal(dist[order], expected[2])
+
+
+def test_radius_scalar():
+
+    series = np.random.RandomState(0).rand(700)
+    index = BoxIndex(series[:, None])
+    _compare(index, 0.01, times=np.arange(700), window=3)
+    _compare(index, 0.3, points=np.array([[0.5], [1.2], [-0.1]]))
+
+
+def test_radius_delay_vectors():
+
+    series = np.random.RandomState(1).randn(2000).cumsum()
+    index = BoxIndex(delay(series, 4, 3))
+    times = np.arange(0, index.size, 7)
+    radii = np.random.RandomState(2).rand(len(times))
+    _compare(index, radii, times=times, window=5, limit=index.size - 10)
+    _compare(index, 100.0, times=times[:20])
+
+
+def test_radius_multivariate():
+
+    data = np.random.RandomState(3).rand(800, 2)
+    index = BoxIndex(delay(data, (2, 3), 2))
+    _compare(index, 0.2, times=np.arange(0, index.size, 5), window=0)
+
+
+def test_knn():
+
+    series = np.random.RandomState(4).rand(1500)
+    vectors = delay(series, 3, 1)
+    index = BoxIndex(vectors)
+    times = np.arange(0, index.size, 11)
+    near, dist = index.knn(5, times=times, window=2, limit=1000)
+    q, j, far = _brute(vectors, np.asarray(vectors)[times], times, np.inf,
+                       2, 1000)
+    for row in range(len(times)):
+        mine = far[q == row]
+        order = np.argsort(mine)[:5]
+        np.testing.assert_array_equal(near[row], j[q == row][order])
+        np.testing.assert_array_equal(dist[row], mine[order])
+
+
+def test_knn_missing():
+
+    index = BoxIndex(np.arange(4.0)[:, None])
+    near, dist = index.knn(3, times=np.arange(4), window=1)
+    assert (near[:, 2] == -1).all()
+    assert np.isinf(dist[:, 2]).all()
+    np.testing.assert_array_equal(near[0, :2], [2, 3])
+
+
+def test_take():
+
+    data = np.arange(40.0).reshape(20, 2)
+    vectors = delay(data, (2, 3), 2)
+    idx = np.array([[0, 3], [5, 1]])
+    rows = take(vectors, idx)
+    assert rows.shape == (2, 2, 6)
+    np.testing.assert_array_equal(rows[1, 0], np.ravel(vectors[5]))
+    assert take(vectors, np.zeros(0, dtype=int)).shape == (0, 6)
+
+
+def test_grow_zero_radius():
+
+    index = BoxIndex(np.zeros((30, 2)))
+    near, dist = index.knn(3, eps=0.0, times=np.arange(30), window=0)
+    assert (near >= 0).all()
+    np.testing.assert_array_equal(dist, 0.0)
+
+
+def test_grow_far_points():
+
+    vectors = np.random.RandomState(0).rand(500, 2)
+    index = BoxIndex(vectors)
+    points = np.array([[0.5, 0.5], [20.0, -3.0], [np.nan, 0.5]])
+    q, j, dist, _ = index.grow(5, eps=0.01, points=points)
+    assert not (q == 2).any()
+    for row in (0, 1):
+        exact = np.abs(vectors - points[row]).max(axis=1)
+        assert (q == row).sum() >= 5
+        np.testing.assert_allclose(np.sort(dist[q == row])[:5],
+                                   np.sort(exact)[:5])
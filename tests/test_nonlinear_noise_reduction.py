@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+import numpy as np
+import pytest
+
+from nonlinear_noise_reduction import ghkss, lazy, nr_lazy, project
+
+
+@pytest.mark.parametrize('reduce', [
+    lambda series: nr_lazy(series, m=3, r=0.05),
+    lambda series: lazy(series, m=5, v=0.05, i=2),
+    lambda series: ghkss(series, m=5, q=2, k=20, r=0.05, i=2),
+    lambda series: project(series, m=5, q=2, r=0.1, k=20, i=2),
+], ids=['nr_lazy', 'lazy', 'ghkss', 'project'])
+def test_noise_level(henon, reduce):
+
+    clean = henon(3000)[:, 0]
+    noise = 0.02 * clean.std() * np.random.RandomState(0).randn(len(clean))
+    cleaned = reduce(clean + noise)
+    assert cleaned.shape == clean.shape
+    # at least a quarter of the noise is removed
+    assert np.sqrt(np.mean((cleaned - clean) ** 2)) < 0.75 * np.sqrt(
+        np.mean(noise ** 2))
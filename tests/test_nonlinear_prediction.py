@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+import numpy as np
+import pytest
+
+from neighbour_search import BoxIndex
+from nonlinear_prediction import (ll_ar, polyback, polynomp, polypar,
+                                  polypar_size, polypar_terms, rbf, rbf_model,
+                                  zeroth)
+from phase_space import delay
+
+
+def test_zeroth_index(henon):
+
+    series = henon(2000)[:, 0]
+    index = BoxIndex(delay(series, 3, 2))
+    np.testing.assert_array_equal(
+        zeroth(series, m=(1, 3), d=2, index=index),
+        zeroth(series, m=(1, 3), d=2))
+
+
+def test_polypar_default_file(henon, tmp_path, monkeypatch):
+
+    monkeypatch.chdir(tmp_path)
+    assert polypar(m=2, p=2) == polypar_size(2, 2) == 6
+    terms = np.loadtxt('parameter.pol', dtype=int)
+    np.testing.assert_array_equal(terms, list(polypar_terms(2, 2)))
+    series = henon(1500)[:, 0]
+    polynomp(series, m=2)
+    polyback(series, m=2)
+
+
+def test_constant_series():
+
+    # errors relative to a vanishing standard deviation
+    with np.errstate(invalid='ignore'):
+        assert np.isnan(zeroth(np.zeros(300), exact=True)).all()
+    # the search radius r=0 falls back to the box size
+    steps = np.arange(300) % 2
+    np.testing.assert_array_equal(zeroth(steps, r=0.0, exact=True), 0.0)
+
+
+def _zeroth_grown(series, lags, d, k, r, f, s):
+
+    '''
+    zeroth -exact as in TISEAN: the radius of every point is grown by f
+    until it has k neighbours.
+
+    '''
+
+    vectors = delay(series, lags, d)
+    newest = (lags - 1) * d
+    usable = len(vectors) - s
+    diameter = np.ptp(vectors, axis=0).max()
+    squares, count = np.zeros(s), 0
+    others = np.arange(usable)
+    for i in range(usable):
+        dist = np.abs(vectors[others] - vectors[i]).max(axis=1)
+        dist[np.abs(others - i) <= s - 1] = np.inf
+        eps = r
+        while (dist < eps).sum() < k and not eps > diameter:
+            eps *= f
+        near = others[dist < eps]
+        if not len(near):
+            continue
+        steps = np.arange(1, s + 1)
+        future = series[newest + near[:, None] + steps].mean(axis=0)
+        squares += (future - series[newest + i + steps]) ** 2
+        count += 1
+    return np.sqrt(squares / count) / series.std()
+
+
+
+
+def test_ll_ar_exact(henon):
+
+    series = henon(800)[:, 0]
+    m, d, s, C = 2, 2, 2, 3
+    result = ll_ar(series, m=m, d=d, i=150, r=0.05, R=2.0, f=1.5, s=s, C=C,
+                   block=40, workers=2)
+    vectors = delay(series, m, d)
+    usable = len(vectors) - s
+    images = series[(m - 1) * d + s:]
+    others = np.arange(usable)
+    for eps, error, fraction, mean, spread in result:
+        squares, counts = [], []
+        for ref in range(150):
+            dist = np.abs(vectors[:usable] - vectors[ref]).max(axis=1)
+            near = others[(dist < eps) & (np.abs(others - ref) >= C)]
+            if len(near) < 2 * (m + 1):
+                continue
+            z = np.column_stack([vectors[near] - vectors[ref],
+                                 np.ones(len(near))])
+            fit = np.linalg.lstsq(z, images[near], rcond=None)[0]
+            squares.append((fit[-1] - images[ref]) ** 2)
+            counts.append(len(near))
+        assert fraction == len(counts) / 150.0
+        if counts:
+            np.testing.assert_allclose(
+                [error, mean, spread],
+                [np.sqrt(np.mean(squares)) / series.std(), np.mean(counts),
+                 np.std(counts)], rtol=1e-6, atol=1e-9)
+
+
+def test_rbf_model_reuse(henon):
+
+    series = henon(2000)[:, 0]
+    model = rbf_model(series, m=2, p=10, s=3, n=1500)
+    _, _, coefficients, errors, prediction = rbf(series, m=2, p=10,
+                                                 s=[1, 2, 3], n=1500, L=1)
+    # step 2 was not fitted: solved with the same factorisation
+    for step in (1, 2, 3):
+        np.testing.assert_allclose(model.solve(step), coefficients[step - 1],
+                                   rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(model.errors(step), errors[step - 1],
+                                   rtol=1e-6)
+    # forecast of the last delay vector = first iterate of the model
+    np.testing.assert_allclose(model.score(delay(series, 2, 1)[-1:]),
+                               prediction, rtol=1e-6)
+    with pytest.raises(ValueError):
+        model.solve(4)
+
+
+def test_zeroth_exact(henon):
+
+    series = henon(600)[:, 0]
+    r = np.ptp(series) / 1000.0
+    errors = zeroth(series, m=(1, 3), d=2, k=10, s=2, exact=True)
+    np.testing.assert_allclose(errors[:, 0],
+                               _zeroth_grown(series, 3, 2, 10, r, 1.2, 2))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+import numpy as np
+
+from neighbour_search import BoxIndex
+from phase_space import (delay, extrema, extrema_chunks, false_nearest,
+                         mutual, mutual_chunks, poincare, poincare_chunks,
+                         svd, upo)
+
+
+def _noisy_sine(size, seed=0):
+
+    noise = np.random.RandomState(seed).randn(size)
+    return np.sin(0.1 * np.arange(size)) + 0.01 * noise
+
+
+def test_svd_offset():
+
+    series = _noisy_sine(20000)
+    covariance = np.cov(delay(series, 4).T, bias=True)
+    exact = np.linalg.eigvalsh(covariance)[::-1]
+    for offset in (0.0, 1e6, 1e8):
+        values, _ = svd(series + offset, m=4, chunk=3000)
+        np.testing.assert_allclose(values, exact, rtol=1e-5, atol=1e-9)
+
+
+def test_svd_memmap(tmp_path):
+
+    path = str(tmp_path / 'series.npy')
+    np.save(path, (1000 * _noisy_sine(5000)).astype(np.int16))
+    mapped = np.load(path, mmap_mode='r')
+    values, projected = svd(mapped, m=4, q=2, chunk=1000)
+    expected = svd(np.array(mapped, dtype=float), m=4, q=2)
+    np.testing.assert_allclose(values, expected[0])
+    np.testing.assert_allclose(projected, expected[1])
+
+
+def test_false_nearest_index(henon):
+
+    series = henon(2000)[:, 0]
+    index = BoxIndex(delay(series, 2, 2))
+    np.testing.assert_array_equal(
+        false_nearest(series, m=2, M=5, d=2, index=index),
+        false_nearest(series, m=2, M=5, d=2))
+
+
+def test_false_nearest_incremental(henon):
+
+    noise = np.random.RandomState(0).randn(3000)
+    henon = henon(3000)[:, 0] + 0.001 * noise
+    sine = np.sin(0.05 * np.arange(3000)) + 0.05 * noise
+    # the sine takes the path of the searches anew, the walk that of the
+    # radius searches
+    for series, d in ((henon, 1), (sine, 5), (noise.cumsum(), 1)):
+        for m in (1, 2):
+            incremental = false_nearest(series, m=m, M=5, d=d, t=2)
+            direct = false_nearest(series, m=m, M=5, d=d, t=2,
+                                   incremental=False)
+            np.testing.assert_array_equal(incremental, direct)
+
+
+def _chunked(series, size):
+
+    return (series[lo:lo + size] for lo in range(0, len(series), size))
+
+
+def test_chunked_generators():
+
+    series = np.sin(0.07 * np.arange(5000)) + np.sin(0.031 * np.arange(5000))
+    np.testing.assert_array_equal(
+        np.concatenate(list(poincare_chunks(_chunked(series, 333),
+                                            series.mean(), m=3, d=4))),
+        poincare(series, m=3, d=4))
+    np.testing.assert_array_equal(
+        np.concatenate(list(extrema_chunks(_chunked(series, 333), w=1))),
+        extrema(series, w=1))
+    for whole, parts in zip(mutual(series, D=10),
+                            mutual_chunks(_chunked(series, 333),
+                                          (series.min(), series.max()),
+                                          D=10)):
+        np.testing.assert_array_equal(whole, parts)
+
+
+def test_upo_henon(henon):
+
+    series = henon(5000)[:, 0]
+    # x = 1 - 1.4 x^2 + 0.3 x, and x1 + x2 = 0.5, x1 x2 = -0.91 / 1.96
+    fixed = np.roots([1.4, 0.7, -1.0]).max()
+    cycle = np.sort(np.roots([1.0, -0.5, -0.91 / 1.96]))
+    (period, orbit, error, stability), = upo(series, m=2, v=0.01, n=500)
+    assert period == 1 and error < 1e-6 and stability > 1
+    np.testing.assert_allclose(orbit, [fixed], atol=0.01)
+    orbits = [found for found in upo(series, m=2, v=0.01, p=2, n=500)
+              if found[0] == 2]
+    period, orbit, error, _ = min(orbits, key=lambda found: found[2])
+    np.testing.assert_allclose(np.sort(orbit), cycle, atol=0.01)
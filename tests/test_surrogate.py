@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+
+import numpy as np
+
+from phase_space import delay
+from surrogate import predict
+
+
+def test_predict(henon):
+
+    series = henon(800)[:, 0]
+    m, d, s, r = 2, 2, 3, 0.05
+    prediction, error = predict(series, m=m, d=d, r=r, s=s)
+    vectors = delay(series, m, d)
+    shift = (m - 1) * d + s
+    usable = len(series) - shift
+    expected = np.full(len(series), np.nan)
+    for i in range(usable):
+        dist = np.abs(vectors[:usable] - vectors[i]).max(axis=1)
+        near = np.nonzero(dist < r)[0]
+        near = near[near != i]
+        if len(near):
+            expected[i + shift] = series[near + shift].mean()
+    np.testing.assert_allclose(prediction, expected)
+    np.testing.assert_allclose(
+        error, np.sqrt(np.nanmean((expected - series) ** 2)))
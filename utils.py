@@ -13,6 +13,10 @@ programs.
 '''
 
 
+import concurrent.futures
+
+import numpy as np
+
 
 def choose():
 
@@ -193,3 +197,118 @@ def events():
     '''
 
     raise NotImplementedError
+
+
+def parallel_map(function, items, workers=None, processes=False):
+
+    '''
+    Map function over items, optionally in parallel
+
+    With workers None or 1 this is the builtin map. Otherwise a pool
+    of that many threads (or processes, if processes is set; then the
+    function and the items have to be picklable) is used. Numpy
+    releases the GIL in most of its heavy kernels, so threads are
+    usually enough. The results are returned in the order of items.
+
+    '''
+
+    items = list(items)
+    if len(items) < 2:
+        workers = None
+    with worker_pool(workers, processes) as pool:
+        return list(pool.map(function, items))
+
+
+def length_scales(n):
+
+    '''
+    The length scales 2**(-k/n), k = 0, 1, ..., down to 2**-64
+
+    In units of the largest length scale, n per octave. Relative to the
+    data interval, only identical points are closer than 2**-64.
+
+    '''
+
+    return 2.0 ** (-np.arange(64 * n + 1) / float(n))
+
+
+def scale_histogram(distances, n):
+
+    '''
+    Histogram of distances over the length_scales(n)
+
+    The distances are in units of the largest length scale. Entry k of
+    the histogram (one longer than the number of scales) counts the
+    distances with exactly k of the scales above them; the last entry
+    also counts the zero distances. The pairs closer than scale k are
+    thus those in the entries k+1, ... The scale is found from the
+    binary exponent and mantissa of each distance (frexp) rather than
+    from a logarithm.
+
+    '''
+
+    scales = 64 * n + 1
+    mantissa, exponent = np.frexp(distances)
+    above = 1 - n * exponent
+    # mantissas in [0.5, 1) below these are one more scale down
+    for step in 2.0 ** (-np.arange(1, n) / float(n)):
+        above += mantissa < step
+    above[mantissa == 0] = scales
+    np.clip(above, 0, scales, out=above)
+    return np.bincount(above.ravel(), minlength=scales + 1)
+
+
+def worker_pool(workers=None, processes=False, initializer=None,
+                initargs=()):
+
+    '''
+    Pool of workers for parallel_map style work in several rounds
+
+    Returns a concurrent.futures executor with workers threads or
+    processes, each set up by initializer(*initargs) (e.g. to keep
+    large arrays in the workers instead of sending them with every
+    task). With workers None or 1, the work is done in this process by
+    a stand-in with the same map, submit and context interface.
+
+    '''
+
+    if not workers or workers == 1:
+        return _SerialPool(initializer, initargs)
+    if processes:
+        return concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=initializer, initargs=initargs)
+    return concurrent.futures.ThreadPoolExecutor(
+        workers, initializer=initializer, initargs=initargs)
+
+
+class _SerialPool(object):
+
+    def __init__(self, initializer, initargs):
+
+        if initializer is not None:
+            initializer(*initargs)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        return False
+
+    def map(self, function, *items):
+
+        return map(function, *items)
+
+    def submit(self, function, *args, **kwargs):
+
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(function(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    def shutdown(self, wait=True):
+
+        pass